@@ -0,0 +1,125 @@
+# -*- coding: utf-8 -*-
+"""
+This plugin measures the cost of simulating a log from a newick tree
+
+It reports the run time, the number of simpy event objects that were
+allocated and the peak memory of the process. The random numbers are drawn
+from numpy blocks or one at a time from the random module.
+
+The same log is simulated a second time without pooling, as a baseline: the
+environment creates a new timeout for every delay and every case builds a new
+process network of fresh zombie arcs. Both runs use the same seed, so they
+simulate the same cases.
+
+INPUT:
+    newick tree file
+    number of cases
+
+OUTPUT:
+    benchmark figures on the standard output
+
+"""
+
+import sys
+import argparse
+import resource
+import time
+from collections import Counter
+sys.path.insert(0, '../newick/')
+sys.path.insert(0, '../simpy/')
+sys.path.insert(0, '../source/')
+from simulateLog import LogSimulator
+from random_stream import RandomStream, BlockRandomStream, BLOCK_SIZE
+from core import Environment
+import events
+
+def count_allocations(counter):
+    '''counts every new event object by its class'''
+    def counting_new(cls, *args, **kwargs):
+        counter[cls.__name__] += 1
+        return object.__new__(cls)
+    events.Event.__new__ = staticmethod(counting_new)
+
+class PlainEnvironment(Environment):
+    '''environment that does not reuse processed timeouts'''
+
+    def recycled_timeout(self, delay, value=None):
+        return events.Timeout(self, delay, value)
+
+class BaselineSimulator(LogSimulator):
+    '''simulator without pooling, it builds a new process network for every case'''
+
+    def create_bpsim(self):
+        self.env = PlainEnvironment()
+        LogSimulator.create_bpsim(self)
+
+    def start_case(self):
+        self.create_case()
+        self.e[0].succeed()
+
+def new_stream():
+    if args.r == 'block':
+        return BlockRandomStream(args.s, block_size=args.b)
+    rng = RandomStream()
+    rng.seed(args.s)
+    return rng
+
+def benchmark(simulator_class):
+    '''simulates the log, returns the simulator, the run time and the allocations'''
+    allocations = Counter()
+    count_allocations(allocations)
+    start = time.time()
+    simulator = simulator_class(args.tree, args.size, args.t, rng=new_stream())
+    return simulator, time.time() - start, allocations
+
+def report(elapsed, allocations):
+    print "simulation time: %.2fs (%.1fus per case)" % (elapsed, 1e6 * elapsed / args.size)
+    print "event objects allocated:", sum(allocations.values()), \
+        "(%.2f per case)" % (float(sum(allocations.values())) / args.size)
+    for name, count in allocations.most_common():
+        print "    %s: %d" % (name, count)
+
+parser = argparse.ArgumentParser(description='Benchmark the simulation of an event log.')
+parser.add_argument('tree', help='newick tree file to simulate')
+parser.add_argument('size', type=int, help='number of traces to simulate')
+parser.add_argument('--t', nargs='?', default=False, type=bool,
+                    help='indicate whether to include timestamps or not, '\
+                    'default=False', metavar='timestamps', choices=[False,True])
+parser.add_argument('--r', nargs='?', default='block',
+                    help='indicate which random number stream to use: block (numpy blocks) '\
+                    'or module (random module), default=block', metavar='rng',
+                    choices=['block','module'])
+parser.add_argument('--b', nargs='?', default=BLOCK_SIZE, type=int,
+                    help='number of random numbers drawn per block, '\
+                    'default=%d' % BLOCK_SIZE, metavar='block_size')
+parser.add_argument('--s', '--seed', nargs='?', default=0, type=int,
+                    help='seed of the random numbers of both runs, default=0', metavar='seed')
+
+args = parser.parse_args()
+
+simulator, elapsed, allocations = benchmark(LogSimulator)
+
+#ru_maxrss is reported in kilobytes on linux, it is read before the baseline runs
+peak_memory = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+baseline, baseline_elapsed, baseline_allocations = benchmark(BaselineSimulator)
+
+print "cases:", args.size
+if args.r == 'block':
+    print "random numbers: numpy blocks of %d" % args.b
+else:
+    print "random numbers: random module"
+print "pooled events and process network:"
+report(elapsed, allocations)
+print "timeouts in the pool:", len(simulator.env._timeouts)
+print "peak memory: %.1f MB" % (peak_memory / 1024.0)
+print "baseline (plain environment, fresh zombies for every case):"
+report(baseline_elapsed, baseline_allocations)
+print "speedup: %.2fx" % (baseline_elapsed / elapsed)
+
+def activities(log):
+    #the timestamps are not compared, they start at the start date of each run
+    return [[event[0] if type(event) is tuple else event for event in trace] for trace in log.traces]
+
+if activities(baseline.log) != activities(simulator.log):
+    print "WARNING: the baseline simulated different traces"
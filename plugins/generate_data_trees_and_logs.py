@@ -4,15 +4,24 @@ sys.path.insert(0, '../source')
 sys.path.insert(0, '../newick/')
 import glob
 import argparse
+import itertools
 from tree import TreeNode
 from tree_with_data_dependencies import TreeWithDataDependencies
 from simulate_tree_with_rules import LogSimulator as LogSimulatorData
+from sample_tree_with_rules import LogSampler as LogSamplerData
 from simulateLog import LogSimulator
-from xes_writer import write_as_xes
+from sampleLog import LogSampler
+from xes_writer import write_as_xes, write_start_tag, write_end_tag
+from tree_pool import process_tree_files
+from encoded_trace import ActivityVocabulary, decode_traces
+from random_stream import BlockRandomStream
 import xml.etree.ElementTree as xmltree
 
-def write_as_xes_cf(traces, index):
-    '''writes log to xes-formatted file'''
+def write_as_xes_cf(traces, index, vocabulary=None):
+    '''writes log to xes-formatted file, encoded traces are decoded with the
+    vocabulary when they are written'''
+    if vocabulary is not None:
+        traces = decode_traces(traces, vocabulary)
     xes_file = open("../data/logs/log" + index + ".xes", 'w')
     xes_file.write('<?xml version="1.0" encoding="UTF-8" ?>\n')
 
@@ -35,8 +44,9 @@ def write_as_xes_cf(traces, index):
 
     i = 1
 
+    write_start_tag(xes_file, root)
     for t in traces:
-        trace = xmltree.SubElement(root, 'trace')
+        trace = xmltree.Element('trace')
         tname = xmltree.SubElement(trace, 'string')
         tname.attrib['key'] = "concept:name"
         tname.attrib['value'] = str(i)
@@ -48,8 +58,9 @@ def write_as_xes_cf(traces, index):
             elf = xmltree.SubElement(event, 'string')
             elf.attrib['key'] = "lifecycle:transition"
             elf.attrib['value'] = 'complete'
+        xes_file.write(xmltree.tostring(trace))
         i += 1
-    xes_file.write(xmltree.tostring(root))
+    write_end_tag(xes_file, root)
     xes_file.close()
 
 def write_decision_tables(tree_w_data, index):
@@ -60,70 +71,104 @@ def write_decision_tables(tree_w_data, index):
         print 'determinism:', str(tree_w_data._calculate_determinism_decision_table(tree_w_data.Delta[d]))
     print 'overall determinism level:', str(tree_w_data.calculate_mean_determinism_level())
 
-parser = argparse.ArgumentParser(description='Generate data dependencies and simulate event logs from process trees.')
-parser.add_argument('--i', nargs='?', default='../data/trees/',
-                    help='specify the relative address to the trees folder' \
-                    ', default=../data/trees/', metavar='input_folder')
-parser.add_argument('--p', nargs='?', default=False, type=bool,
-                    help='print decision tables in separate files, '\
-                    'default=False', metavar='print_decision_tables', choices=[False,True])
-parser.add_argument('size', type=int, help='number of cases to simulate')
-parser.add_argument('noise_size', type=int, help='number of noisy cases to simulate')
-parser.add_argument('nodes', type=int, help='maximum input variables of each decision')
-parser.add_argument('cutoff', type=int, help='maximum cutoff values for numerical variable')
-parser.add_argument('determinism', type=float, help='target determinism level')
-
-args = parser.parse_args()
-
-if args.determinism < 0.0 or args.determinism > 1.0:
-    print "ERROR: specify target determinism level in range [0,1]"
-    sys.exit()
-
-print "start of plugin with arguments: ", args
-
-#read the input parameters
-number_of_cases = args.size
-no_noisy_cases = args.noise_size
-target_determinism_level = args.determinism
-max_input_nodes = args.nodes
-max_cutoff_values = args.cutoff
-tree_folder = args.i
-print_decision_tables = args.p
-
-#specify the folder with the trees
-tree_files = glob.glob(tree_folder + "*.nw")
-
-# for each tree
-for filepath in tree_files:
+def generate_data_log(filepath, args):
+    '''adds data dependencies to a tree file, simulates its log and writes the log'''
     # get tree index
     i = filepath[filepath.find('_'):filepath.rfind('.nw')]
 
+    # stream of the random numbers of the simulation, the random module by default
+    if args.r == 'block':
+        rng = BlockRandomStream()
+    else:
+        rng = None
+
     # generate traces
     tree = TreeNode(filepath, format=1)
     tree_w_data = TreeWithDataDependencies(tree.write(format=1, format_root_node=True),
-                                           str(i), target_dl=target_determinism_level)
+                                           str(i), target_dl=args.determinism)
     if (not tree_w_data.data_dependencies_possible):
-        simulator = LogSimulator(tree.write(format=1, format_root_node=True), 1000, record_timestamps=False)
-        traces = simulator.returnLog()
-        write_as_xes_cf(traces, i)
+        vocabulary = ActivityVocabulary.from_tree(tree)
+        if args.e == 'direct':
+            simulator = LogSampler(tree.write(format=1, format_root_node=True), 0, record_timestamps=False,
+                                   rng=rng, vocabulary=vocabulary)
+        else:
+            simulator = LogSimulator(tree.write(format=1, format_root_node=True), 0, record_timestamps=False,
+                                     rng=rng, vocabulary=vocabulary)
+        write_as_xes_cf(simulator.iter_traces(1000), i, vocabulary)
         dl = ''
     else:
-        tree_w_data.extend_tree_with_data_dependencies(max_input_nodes, max_cutoff_values)
+        tree_w_data.extend_tree_with_data_dependencies(args.nodes, args.cutoff)
         # write decision tables
         if args.p:
             write_decision_tables(tree_w_data,i)
         # simulate tree with data dependencies
         # all cases are fitting to the tree with data dependencies
-        simulator = LogSimulatorData(tree_w_data.t,
-                                     tree_w_data.input_choice_dictionary,
-                                     tree_w_data.rules_simulation,
-                                     tree_w_data.case_attr,
-                                     False)
-        simulator.simulate(number_of_cases)
-        # simulate noisy cases based on removed rules
-        simulator.simulate_noise(number_of_cases, no_noisy_cases, tree_w_data.removed_rules_simulation)
-        # write the simulated log to a xes file
-        write_as_xes(simulator.log.cases, i)
+        # the traces are encoded and decoded again when they are written
+        vocabulary = ActivityVocabulary.from_tree(tree_w_data.t)
+        if args.e == 'direct':
+            simulator = LogSamplerData(tree_w_data.t,
+                                       tree_w_data.input_choice_dictionary,
+                                       tree_w_data.rules_simulation,
+                                       tree_w_data.case_attr,
+                                       False,
+                                       rng=rng,
+                                       vocabulary=vocabulary)
+        else:
+            simulator = LogSimulatorData(tree_w_data.t,
+                                         tree_w_data.input_choice_dictionary,
+                                         tree_w_data.rules_simulation,
+                                         tree_w_data.case_attr,
+                                         False,
+                                         rng=rng,
+                                         vocabulary=vocabulary)
+        # the fitting cases are followed by noisy cases based on removed rules,
+        # every case is written to the xes file as soon as it is simulated
+        cases = itertools.chain(simulator.iter_cases(args.size),
+                                simulator.iter_noisy_cases(args.size, args.noise_size,
+                                                           tree_w_data.removed_rules_simulation))
+        write_as_xes(cases, i, vocabulary=vocabulary)
+        # the noisy cases are forced towards a removed rule, rejected attempts are simulated again
+        if simulator.noise_acceptance_rate() is not None:
+            print "log%s: acceptance rate of the noisy cases %.3f" % (i, simulator.noise_acceptance_rate())
         # write determinism level
         dl = tree_w_data.final_average_determinism_level
         # print "determinism level:", dl
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Generate data dependencies and simulate event logs from process trees.')
+    parser.add_argument('--i', nargs='?', default='../data/trees/',
+                        help='specify the relative address to the trees folder' \
+                        ', default=../data/trees/', metavar='input_folder')
+    parser.add_argument('--p', nargs='?', default=False, type=bool,
+                        help='print decision tables in separate files, '\
+                        'default=False', metavar='print_decision_tables', choices=[False,True])
+    parser.add_argument('size', type=int, help='number of cases to simulate')
+    parser.add_argument('noise_size', type=int, help='number of noisy cases to simulate')
+    parser.add_argument('nodes', type=int, help='maximum input variables of each decision')
+    parser.add_argument('cutoff', type=int, help='maximum cutoff values for numerical variable')
+    parser.add_argument('determinism', type=float, help='target determinism level')
+    parser.add_argument('--e', nargs='?', default='simpy',
+                        help='indicate which engine to use for the simulation: simpy or direct '\
+                        '(walks the tree and resolves each choice with its compiled rules), '\
+                        'default=simpy', metavar='engine', choices=['simpy','direct'])
+    parser.add_argument('--w', '--workers', nargs='?', default=1, type=int,
+                        help='number of worker processes that process a tree each, '\
+                        'default=1', metavar='workers')
+    parser.add_argument('--r', nargs='?', default='module',
+                        help='indicate which random number stream to use: module (random '\
+                        'module) or block (numpy blocks), default=module', metavar='rng',
+                        choices=['module','block'])
+
+    args = parser.parse_args()
+
+    if args.determinism < 0.0 or args.determinism > 1.0:
+        print "ERROR: specify target determinism level in range [0,1]"
+        sys.exit()
+
+    print "start of plugin with arguments: ", args
+
+    #specify the folder with the trees
+    tree_files = glob.glob(args.i + "*.nw")
+
+    # each tree is processed on its own, a failing tree does not stop the others
+    process_tree_files(tree_files, generate_data_log, args, args.w)
@@ -10,30 +10,45 @@ INPUT:
     set of newick trees
     number of cases
 
-OUTPUT:import argparse
+OUTPUT:
     logs in csv-file format
 
 """
 
 
 import glob
+import os
 import sys
+import argparse
 sys.path.insert(0, '../newick/')
 sys.path.insert(0, '../simpy/')
 sys.path.insert(0, '../source/')
 from tree import TreeNode
 from simulateLog import LogSimulator
 from simulateTrace import TraceSimulator
+from sampleLog import LogSampler
+from generateSampler import CompiledSampler
+from sampleVariants import VariantSampler
 from add_noise import NoiseGenerator
+from random_stream import CaseRandomStream, BlockRandomStream, case_seed, default_stream, MASK32
+from tree_pool import process_tree_files
+from xes_writer import write_start_tag, write_end_tag
+from encoded_trace import ActivityVocabulary, decode_traces
+from shared_traces import write_shared_traces, read_shared_traces, remove_shared_traces
 import xml.etree.ElementTree as xmltree
-import timing
 import random
+import datetime
+from bisect import bisect_right
+import multiprocessing
 
-def write_as_csv(traces,tree_index,record_timestamps):
+def write_as_csv(traces,tree_index,record_timestamps,vocabulary=None,start_date=None):
     '''writes log to a csv-formatted file:
         case_id,act_name
         1,a
-        1,b'''
+        1,b
+    encoded traces are decoded with the vocabulary when they are written'''
+    if vocabulary is not None:
+        traces = decode_traces(traces, vocabulary, start_date)
     csv_file = open("../data/logs/log" + tree_index + ".csv", 'w')
     if record_timestamps:
         csv_file.write("traceid,activity,start_time,end_time\n")
@@ -55,8 +70,11 @@ def write_as_csv(traces,tree_index,record_timestamps):
 
     csv_file.close()
 
-def write_as_xes(traces,tree_index,record_timestamps):
-    '''writes log to xes-formatted file'''
+def write_as_xes(traces,tree_index,record_timestamps,vocabulary=None,start_date=None):
+    '''writes log to xes-formatted file, encoded traces are decoded with the
+    vocabulary when they are written'''
+    if vocabulary is not None:
+        traces = decode_traces(traces, vocabulary, start_date)
     xes_file = open("../data/logs/log" + tree_index + ".xes", 'w')
     xes_file.write('<?xml version="1.0" encoding="UTF-8" ?>\n')
     
@@ -96,8 +114,10 @@ def write_as_xes(traces,tree_index,record_timestamps):
     
     i = 1
     
+    #the traces are written one at a time, the log is never held in memory
+    write_start_tag(xes_file, root)
     for t in traces:
-        trace = xmltree.SubElement(root,'trace')
+        trace = xmltree.Element('trace')
         tname = xmltree.SubElement(trace,'string')
         tname.attrib['key'] = "concept:name"
         tname.attrib['value'] = str(i)
@@ -132,92 +152,301 @@ def write_as_xes(traces,tree_index,record_timestamps):
 				elf = xmltree.SubElement(event,'string')
 				elf.attrib['key'] = "lifecycle:transition"
 				elf.attrib['value'] = 'complete'
+        xes_file.write(xmltree.tostring(trace))
         i += 1
-    xes_file.write(xmltree.tostring(root))
+    write_end_tag(xes_file, root)
     xes_file.close()
     
-def select_child(children):
-    x = random.random()
+def choice_cutoffs(children):
+    '''cutoffs of all children of a choice except the last, a random number below the
+    cutoff of a child selects it, the last child takes the rest'''
     cutoffs = []
     previous_cutoff = 0
 
     for i in range(len(children) - 1):
         cutoffs.append(previous_cutoff + children[i].dist)
         previous_cutoff = previous_cutoff + children[i].dist
+    return cutoffs
 
-    j = len(cutoffs)
-    for i in range(len(cutoffs)):
-        if x < cutoffs[i]:
-            j = i
-            break
-    return children[j]
-    
+def child_simulator(child, record_timestamps, rng, vocabulary, start_time=0):
+    '''simulator of a child of the root, it simulates its first case from start_time
+    when it is created'''
+    if child.is_leaf():
+        artificial_parent = TreeNode('sequence:1;')
+        artificial_parent.add_child(child=child)
+        child = artificial_parent
+    return TraceSimulator(child.write(format=1,format_root_node=True),
+                          record_timestamps, rng=rng, vocabulary=vocabulary,
+                          start_time=start_time)
 
+#number of cases per shard, the vectorised engine draws the cases of a shard at once, so
+#the size is fixed to keep a seeded log independent of the number of workers
+SHARD_SIZE = 10000
 
-parser = argparse.ArgumentParser(description='Simulate event logs from process trees.')
-parser.add_argument('--i', nargs='?', default='../data/trees/',
-                    help='specify the relative address to the trees folder' \
-                    ', default=../data/trees/', metavar='input_folder')
-parser.add_argument('size', type=int, help='number of traces to simulate')
-parser.add_argument('noise', type=float, help='probability to insert noise into trace')
-parser.add_argument('--t', nargs='?', default=False, type=bool,
-                    help='indicate whether to include timestamps or not, '\
-                    'default=False', metavar='timestamps', choices=[False,True])
-parser.add_argument('--f', nargs='?', default='xes',
-                    help='indicate which format to use for the log: xes or csv, '\
-                    'default=xes', metavar='format')
+def iter_traces(newick_tree,no_cases,record_timestamps,engine,rng=None,dump_path=None,
+                first_case=0,vocabulary=None,end_times=None):
+    '''simulates the cases first_case to first_case + no_cases of a tree with the given
+    engine and yields their traces one at a time, encoded when a vocabulary is given,
+    once the last trace is yielded the clock of the engine (the time at which the last
+    case ended, silent activities included) is appended to end_times when it is given'''
+    t = TreeNode(newick_tree,format=1)
+    if rng is None:
+        rng = default_stream
+    if engine == 'variants':
+        try:
+            if record_timestamps:
+                raise ValueError("timestamps are not supported")
+            sampler = VariantSampler(newick_tree, 0, rng=rng, vocabulary=vocabulary)
+        except ValueError as error:
+            print "the variants of the tree are not sampled (%s), it is simulated instead" % error
+            engine = 'simpy'
+    #function that returns the clock of the engine, the variant sampler has none
+    clock = lambda: 0
+    if engine == 'variants':
+        traces = sampler.iter_traces(no_cases)
+    elif engine == 'direct':
+        sampler = LogSampler(t.write(format=1,format_root_node=True),0, record_timestamps,
+                             rng=rng, vocabulary=vocabulary)
+        traces = sampler.iter_traces(no_cases, first_case)
+        clock = lambda: sampler.now
+    elif engine == 'compiled':
+        sampler = CompiledSampler(t.write(format=1,format_root_node=True),0, record_timestamps,
+                                  rng=rng, vocabulary=vocabulary)
+        if dump_path is not None:
+            sampler.dump_source(dump_path)
+        traces = sampler.iter_traces(no_cases, first_case)
+        clock = lambda: sampler.now
+    elif engine == 'vectorised':
+        simulator = LogSimulator(t.write(format=1,format_root_node=True),0, record_timestamps,
+                                 mode='vectorised', rng=rng, vocabulary=vocabulary)
+        traces = simulator.iter_traces(no_cases)
+        clock = lambda: simulator.vectorised_simulator.now
+    elif t.get_tree_root().name == 'choice':
+        #the clock of the last simulator that ran a case
+        choice_end_times = []
+        traces = iter_choice_traces(t, no_cases, record_timestamps, rng, first_case, vocabulary,
+                                    choice_end_times)
+        clock = lambda: choice_end_times[0]
+    else:
+        simulator = LogSimulator(t.write(format=1,format_root_node=True),0, record_timestamps,
+                                 rng=rng, vocabulary=vocabulary)
+        traces = simulator.iter_traces(no_cases, first_case)
+        clock = lambda: simulator.env.now
+    for trace in traces:
+        yield trace
+    if end_times is not None:
+        end_times.append(clock())
 
-args = parser.parse_args()
+def iter_choice_traces(t,no_cases,record_timestamps,rng,first_case,vocabulary=None,end_times=None):
+    '''yields the traces of a tree with a choice at the root, every case simulates
+    only the child selected for it. The child is drawn from the stream of the case,
+    so a case selects the same child in any case range. The simulator of a child is
+    built the first time a case selects it and its process network is reused by the
+    next cases, every case starts when the case before it ended, whichever child
+    simulated that case. The clock after the last case is appended to end_times.'''
+    children = t.get_children()
+    cutoffs = choice_cutoffs(children)
+    simulators = dict()
+    clock = 0
+    for i in xrange(first_case, first_case + no_cases):
+        rng.start_case(i)
+        index = bisect_right(cutoffs, rng.random())
+        if index in simulators:
+            trace = simulators[index].simulate_case(clock)
+        else:
+            simulators[index] = child_simulator(children[index], record_timestamps,
+                                                rng, vocabulary, clock)
+            trace = simulators[index].returnTrace()
+        clock = simulators[index].env.now
+        yield trace
+    if end_times is not None:
+        end_times.append(clock)
 
-if args.noise < 0.0 or args.noise > 1.0:
-    print "ERROR: specify noise probability in range [0,1]"
-    sys.exit()
+def simulate_shard(shard, end_times=None):
+    '''simulates a shard of the cases of a seeded tree, every case with its own stream or,
+    with the block stream, the shard with its own numpy blocks, a shard is a tuple (newick
+    tree, tree index, first case, number of cases, timestamps, engine, seed, stream, dump
+    path), yields its traces encoded with the vocabulary of the tree and then appends the
+    clock of the shard to end_times'''
+    newick_tree, tree_index, first_case, no_cases, record_timestamps, engine, seed, stream, \
+        dump_path = shard
+    if stream == 'block':
+        rng = BlockRandomStream(case_seed(seed, tree_index, first_case) & MASK32)
+    else:
+        rng = CaseRandomStream(seed, tree_index)
+        #the vectorised and variants engines do not start the cases one by one
+        rng.generator.seed(case_seed(seed, tree_index, first_case) & MASK32)
+    vocabulary = ActivityVocabulary.from_tree(TreeNode(newick_tree,format=1))
+    return iter_traces(newick_tree, no_cases, record_timestamps, engine,
+                       rng, dump_path, first_case, vocabulary, end_times)
 
-print "start of plugin with arguments: ", args
+def log_shards(newick_tree,tree_index,no_cases,record_timestamps,engine,seed,stream,dump_path=None,
+               shard_size=SHARD_SIZE):
+    '''splits the cases of a seeded log into shards of shard_size cases, the code of the
+    compiled engine is only dumped by the first shard'''
+    shards = []
+    for first_case in range(0, no_cases, shard_size):
+        shards.append((newick_tree, tree_index, first_case, min(shard_size, no_cases - first_case),
+                       record_timestamps, engine, seed, stream,
+                       dump_path if first_case == 0 else None))
+    return shards
 
-#read the input parameters
-no_cases = args.size
-noise_probability = args.noise
-tree_folder = args.i
-record_timestamps = args.t
-format_log = args.f
+def simulate_shared_shard(shard):
+    '''simulates a shard in a worker of the shard pool, its traces are written to shared
+    memory and only the metadata of the shared memory file and the clock of the shard
+    are returned'''
+    end_times = []
+    shared = write_shared_traces(simulate_shard(shard, end_times))
+    return shared, end_times[0]
 
-#specify the folder with the trees
-tree_files = glob.glob(tree_folder + "*.nw")
+def iter_shards(shards):
+    '''yields the traces of the shards in order of their cases. every shard starts its
+    clock at 0, the times of a timed shard are shifted by the clocks of the shards before
+    it at their end, so that the clock runs on from one case to the next as in one
+    simulation (also across trailing silent activities and shards without events).
+    the shard pool simulates as many shards at a time as it has workers.'''
+    offset = 0
+    if shard_pool is None:
+        for shard in shards:
+            end_times = []
+            for trace in simulate_shard(shard, end_times):
+                if trace.starts is not None and offset:
+                    trace.shift(offset)
+                yield trace
+            offset = offset + end_times[0]
+        return
+    for first_shard in range(0, len(shards), shard_pool_size):
+        shared_shards = shard_pool.map(simulate_shared_shard,
+                                       shards[first_shard:first_shard + shard_pool_size],
+                                       chunksize=1)
+        try:
+            while shared_shards:
+                shared, end_time = shared_shards.pop(0)
+                #the shared traces are shifted in place, all at once
+                for trace in read_shared_traces(shared, offset):
+                    yield trace
+                offset = offset + end_time
+        finally:
+            #the files of shards that were not read when the log is abandoned
+            for shared, end_time in shared_shards:
+                remove_shared_traces(shared)
 
-#for each tree
-for filepath in tree_files:
-    
-    #generate traces
+#pool that simulates the shards of a log, when the trees are processed one after the other
+shard_pool = None
+shard_pool_size = 1
+
+def generate_log(filepath, args):
+    '''simulates the log of a tree file, adds noise and writes the log'''
+    no_cases = args.size
+    record_timestamps = args.t
+    engine = args.e
+    seed = args.s
+
+    tree_index = filepath[filepath.find('_'):filepath.rfind('.nw')]
+    if args.d is not None:
+        dump_path = args.d + "sampler" + tree_index + ".py"
+    else:
+        dump_path = None
+
+    #generate traces, they are passed on to the noise and the writer one at a time
+    #and are only decoded when they are written
     t = TreeNode(filepath,format=1)
-    if t.get_tree_root().name == 'choice':
-        traces = []
-        children = t.get_children()
-        for i in range(no_cases):
-            child = select_child(children)
-            if child.is_leaf():
-                artificial_parent = TreeNode('sequence:1;')
-                artificial_parent.add_child(child=child)
-                simulator = TraceSimulator(artificial_parent.write(format=1,format_root_node=True),
-                                           record_timestamps)
-            else:
-                simulator = TraceSimulator(child.write(format=1,format_root_node=True),
-                                           record_timestamps)
-            
-            traces.append(simulator.case.trace)
+    newick_tree = t.write(format=1,format_root_node=True)
+    vocabulary = ActivityVocabulary.from_tree(t)
+    start_date = datetime.datetime.today()
+    if args.w == 1 and seed is None:
+        if args.r == 'block':
+            rng = BlockRandomStream()
+        else:
+            rng = None
+        traces = iter_traces(newick_tree, no_cases, record_timestamps, engine, rng,
+                             dump_path=dump_path, vocabulary=vocabulary)
+        noise_generator = NoiseGenerator([], args.noise)
     else:
-        simulator = LogSimulator(t.write(format=1,format_root_node=True),no_cases, record_timestamps)
-        traces = simulator.returnLog()
+        #the case range is split into shards of SHARD_SIZE cases and the traces of
+        #the shards are merged in order of the case ids
+        if seed is None:
+            seed = random.randint(0, 2**31 - 1)
+        shards = log_shards(newick_tree, tree_index, no_cases, record_timestamps, engine, seed,
+                            args.r, dump_path)
+        traces = iter_shards(shards)
+        #the noise has its own stream
+        noise_generator = NoiseGenerator([], args.noise, case_seed(seed, tree_index, -1))
 
     #add noise
-    noise_generator = NoiseGenerator(traces, noise_probability)
-    traces = noise_generator.resulting_traces
+    traces = noise_generator.iter_noise(args.noise, traces)
 
     #write log to csv-file
-    tree_index = filepath[filepath.find('_'):filepath.rfind('.nw')]
-    if format_log == 'csv':
-		write_as_csv(traces,tree_index,record_timestamps)
-    elif format_log == 'xes':
-		write_as_xes(traces,tree_index,record_timestamps)
-	
-timing.endlog()
+    if args.f == 'csv':
+        write_as_csv(traces,tree_index,record_timestamps,vocabulary,start_date)
+    elif args.f == 'xes':
+        write_as_xes(traces,tree_index,record_timestamps,vocabulary,start_date)
+
+
+if __name__ == '__main__':
+    import timing
+
+    parser = argparse.ArgumentParser(description='Simulate event logs from process trees.')
+    parser.add_argument('--i', nargs='?', default='../data/trees/',
+                        help='specify the relative address to the trees folder' \
+                        ', default=../data/trees/', metavar='input_folder')
+    parser.add_argument('size', type=int, help='number of traces to simulate')
+    parser.add_argument('noise', type=float, help='probability to insert noise into trace')
+    parser.add_argument('--t', nargs='?', default=False, type=bool,
+                        help='indicate whether to include timestamps or not, '\
+                        'default=False', metavar='timestamps', choices=[False,True])
+    parser.add_argument('--f', nargs='?', default='xes',
+                        help='indicate which format to use for the log: xes or csv, '\
+                        'default=xes', metavar='format')
+    parser.add_argument('--e', nargs='?', default='simpy',
+                        help='indicate which engine to use for the simulation: simpy, '\
+                        'direct (walks the tree without an event loop), compiled '\
+                        '(runs python code generated for the tree), vectorised (simulates '\
+                        'all cases at once with numpy) or variants (draws the number of cases of '\
+                        'each trace variant, for trees without concurrency and timestamps), '\
+                        'default=simpy', metavar='engine',
+                        choices=['simpy','direct','compiled','vectorised','variants'])
+    parser.add_argument('--d', nargs='?', default=None,
+                        help='specify the relative address to a folder in which the compiled '\
+                        'engine dumps the code generated for each tree', metavar='dump_folder')
+    parser.add_argument('--w', '--workers', nargs='?', default=1, type=int,
+                        help='number of worker processes, they simulate a tree each or the '\
+                        'shards of the log of a single tree, default=1', metavar='workers')
+    parser.add_argument('--s', '--seed', nargs='?', default=None, type=int,
+                        help='seed of the simulation, every case of a seeded log has its own '\
+                        'random stream (every shard of 10000 cases with --r block), the log is '\
+                        'the same for any number of workers', metavar='seed')
+    parser.add_argument('--r', nargs='?', default='module',
+                        help='indicate which random number stream to use: module (random '\
+                        'module) or block (numpy blocks), default=module', metavar='rng',
+                        choices=['module','block'])
+
+    args = parser.parse_args()
+
+    if args.noise < 0.0 or args.noise > 1.0:
+        print "ERROR: specify noise probability in range [0,1]"
+        sys.exit()
+
+    print "start of plugin with arguments: ", args
+
+    #read the input parameters
+    tree_folder = args.i
+    workers = args.w
+
+    #specify the folder with the trees
+    tree_files = glob.glob(tree_folder + "*.nw")
+
+    #with several trees the workers process one tree each, the shards of a log are then
+    #simulated one after the other, with a single tree the workers simulate its shards
+    if workers > 1 and len(tree_files) > 1:
+        process_tree_files(tree_files, generate_log, args, workers)
+    else:
+        if workers > 1:
+            shard_pool = multiprocessing.Pool(workers)
+            shard_pool_size = workers
+        process_tree_files(tree_files, generate_log, args)
+        if shard_pool is not None:
+            shard_pool.close()
+            shard_pool.join()
+
+    timing.endlog()
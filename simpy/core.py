@@ -5,9 +5,10 @@ Core components for event-discrete simulation environments.
 import types
 from heapq import heappush, heappop
 from itertools import count
+from collections import deque
 
-from events import (AllOf, AnyOf, Event, Process, Timeout, URGENT,
-                          NORMAL)
+from events import (AllOf, AnyOf, Event, Process, Timeout, RecycledTimeout,
+                    URGENT, NORMAL)
 
 
 Infinity = float('inf')  #: Convenience alias for infinity
@@ -164,10 +165,17 @@ class Environment(BaseEnvironment):
     This class also provides aliases for common event types, for example
     :attr:`process`, :attr:`timeout` and :attr:`event`.
 
+    Events that are scheduled without a delay bypass the heap. They are kept
+    in a FIFO queue per priority and processed before the heap advances the
+    time (see :meth:`step()`).
+
     """
     def __init__(self, initial_time=0):
         self._now = initial_time
         self._queue = []  # The list of all currently scheduled events.
+        self._timeouts = []  # Processed timeouts that can be handed out again.
+        # Events scheduled for the current time, one FIFO per priority.
+        self._immediate = (deque(), deque())  # (URGENT, NORMAL)
         self._eid = count()  # Counter for event IDs
         self._active_proc = None
 
@@ -190,14 +198,53 @@ class Environment(BaseEnvironment):
     all_of = BoundClass(AllOf)
     any_of = BoundClass(AnyOf)
 
+    def recycled_timeout(self, delay, value=None):
+        """Return a :class:`~simpy.events.Timeout` like :attr:`timeout`, but
+        reuse a processed timeout of this environment if one is available.
+
+        The returned event is handed out again once it has been processed, so
+        it may only be yielded by a single process and must not be referenced
+        afterwards.
+
+        """
+        pool = self._timeouts
+        if not pool:
+            return RecycledTimeout(self, delay, value)
+        if delay < 0:
+            raise ValueError('Negative delay %s' % delay)
+        event = pool.pop()
+        event.callbacks = []
+        event._value = value
+        event._delay = delay
+        self.schedule(event, NORMAL, delay)
+        return event
+
     def schedule(self, event, priority=NORMAL, delay=0):
         """Schedule an *event* with a given *priority* and a *delay*."""
-        heappush(self._queue,
-                 (self._now + delay, priority, next(self._eid), event))
+        if delay == 0 and (priority == URGENT or priority == NORMAL):
+            self._immediate[priority].append(event)
+        else:
+            heappush(self._queue,
+                     (self._now + delay, priority, next(self._eid), event))
+
+    def reset(self, now):
+        """Set the current simulation time to *now*.
+
+        The environment must not have any scheduled events left, e.g. after
+        :meth:`run()` returned because the schedule is empty. Raise a
+        :exc:`RuntimeError` otherwise.
+
+        """
+        if self._queue or self._immediate[URGENT] or self._immediate[NORMAL]:
+            raise RuntimeError('Cannot reset the time of an environment with '
+                               'scheduled events')
+        self._now = now
 
     def peek(self):
         """Get the time of the next scheduled event. Return
         :data:`~simpy.core.Infinity` if there is no further event."""
+        if self._immediate[URGENT] or self._immediate[NORMAL]:
+            return self._now
         try:
             return self._queue[0][0]
         except IndexError:
@@ -208,11 +255,30 @@ class Environment(BaseEnvironment):
 
         Raise an :exc:`EmptySchedule` if no further events are available.
 
+        Events in the FIFO queues of the current time are processed in the
+        same order as the heap would: by priority and then in the order in
+        which they were scheduled. A heap event that is due now was scheduled
+        at an earlier time, so it precedes immediate events of its own or
+        a lower priority.
+
         """
-        try:
-            self._now, _, _, event = heappop(self._queue)
-        except IndexError:
-            raise EmptySchedule()
+        urgent, normal = self._immediate
+        if urgent:
+            immediate, priority = urgent, URGENT
+        elif normal:
+            immediate, priority = normal, NORMAL
+        else:
+            immediate = None
+
+        queue = self._queue
+        if immediate is not None and not (queue and queue[0][0] == self._now
+                                          and queue[0][1] <= priority):
+            event = immediate.popleft()
+        else:
+            try:
+                self._now, _, _, event = heappop(queue)
+            except IndexError:
+                raise EmptySchedule()
 
         # Process callbacks of the event. Set the events callbacks to None
         # immediately to prevent concurrent modifications.
@@ -227,3 +293,6 @@ class Environment(BaseEnvironment):
             exc = type(event._value)(*event._value.args)
             exc.__cause__ = event._value
             raise exc
+
+        if type(event) is RecycledTimeout:
+            self._timeouts.append(event)
@@ -62,7 +62,13 @@ class Event(object):
     a :class:`Condition` event is generated that lets you wait for both or one
     of them.
 
+    Events declare their attributes in ``__slots__`` to keep the many event
+    instances of a simulation small. Subclasses without ``__slots__`` get
+    a ``__dict__`` as usual.
+
     """
+    __slots__ = ('env', 'callbacks', '_value', 'ok', 'defused')
+
     def __init__(self, env):
         self.env = env
         """The :class:`~simpy.core.Environment` the event lives in."""
@@ -168,6 +174,8 @@ class Timeout(Event):
     This event is automatically triggered when it is created.
 
     """
+    __slots__ = ('_delay',)
+
     def __init__(self, env, delay, value=None):
         if delay < 0:
             raise ValueError('Negative delay %s' % delay)
@@ -187,12 +195,23 @@ class Timeout(Event):
                              (', value=%s' % self._value))
 
 
+class RecycledTimeout(Timeout):
+    """A :class:`Timeout` that is returned to the pool of its environment once
+    it has been processed (see
+    :meth:`~simpy.core.Environment.recycled_timeout()`).
+
+    """
+    __slots__ = ()
+
+
 class Initialize(Event):
     """Initializes a process. Only used internally by :class:`Process`.
 
     This event is automatically triggered when it is created.
 
     """
+    __slots__ = ()
+
     def __init__(self, env, process):
         # NOTE: The following initialization code is inlined from
         # Event.__init__() for performance reasons.
@@ -214,6 +233,8 @@ class Interruption(Event):
     This event is automatically triggered when it is created.
 
     """
+    __slots__ = ('process',)
+
     def __init__(self, process, cause):
         # NOTE: The following initialization code is inlined from
         # Event.__init__() for performance reasons.
@@ -268,6 +289,8 @@ class Process(Event):
     Processes can be interrupted during their execution by :meth:`interrupt`.
 
     """
+    __slots__ = ('_generator', '_target')
+
     def __init__(self, env, generator):
         if not isgenerator(generator):
             raise ValueError('%s is not a generator.' % generator)
@@ -444,6 +467,8 @@ class Condition(Event):
     Condition events can be nested.
 
     """
+    __slots__ = ('_evaluate', '_events', '_count')
+
     def __init__(self, env, evaluate, events):
         super(Condition, self).__init__(env)
         self._evaluate = evaluate
@@ -522,10 +547,6 @@ class Condition(Event):
         """An evaluation function that returns ``True`` if at least one of
         *events* has been triggered."""
         return count > 0 or len(events) == 0
-    
-    @staticmethod
-    def n_events(required_events, count):
-        return required_events == count
 
 
 class AllOf(Condition):
@@ -534,6 +555,8 @@ class AllOf(Condition):
     any of *events* failed.
 
     """
+    __slots__ = ()
+
     def __init__(self, env, events):
         super(AllOf, self).__init__(env, Condition.all_events, events)
 
@@ -544,32 +567,11 @@ class AnyOf(Condition):
     any of *events* failed.
 
     """
+    __slots__ = ()
+
     def __init__(self, env, events):
         super(AnyOf, self).__init__(env, Condition.any_events, events)
 
-class NOf(Condition):
-    def __init__(self, env, events, or_dict, or_):
-        super(NOf, self).__init__(env, Condition.n_events, events)
-        self._or_dict = or_dict
-        self._or_ = or_
-    
-    def _check(self, event):
-        """Check if the condition was already met and schedule the *event* if
-        so."""
-        if self._value is not PENDING:
-            return
-
-        self._count += 1
-
-        if not event.ok:
-            # Abort if the event has failed.
-            event.defused = True
-            self.fail(event._value)
-        elif self._evaluate(self._or_dict[self._or_], self._count):
-            # The condition has been met. The _collect_values callback will
-            # populate set the value once this condition gets processed.
-            self.succeed()
-    
 class Interrupt(Exception):
     """Exception thrown into a process if it is interrupted (see
     :func:`~simpy.events.Process.interrupt()`).
@@ -604,20 +606,101 @@ def _describe_frame(frame):
                                                       line.strip())
 
 class Zombie(Event):
+    __slots__ = ('once_executed', 'last_chosen', 'hooks')
 
     def __init__(self, env):
         super(Zombie, self).__init__(env)
         self.once_executed = False
         self.last_chosen = True
-        #self._backup_callbacks = []
+        #callbacks that stay registered on the arc, see attach()
+        self.hooks = ()
+
+    def attach(self, callback):
+        """Register *callback* for good: unlike the callbacks of a process
+        that waits on the arc, it is restored whenever the arc is reset."""
+        self.hooks += (callback,)
+        if self.callbacks is not None:
+            self.callbacks.append(callback)
 
     def reset(self):
-        #self.callbacks = self._backup_callbacks
-        #self._backup_callbacks = []
-        self.callbacks = []
+        #ok is only read once the arc has been triggered again, which sets it
+        self.callbacks = list(self.hooks)
         self._value = PENDING
         self.once_executed = True
-        try:
-            del self.ok
-        except:
-            pass
+
+    def clear(self):
+        """Bring the arc back to its initial state before a new case is
+        started. Unlike :meth:`reset`, the callbacks of processes that are
+        already waiting on the arc are kept."""
+        if self.callbacks is None:
+            self.callbacks = list(self.hooks)
+        self._value = PENDING
+        self.once_executed = False
+        self.last_chosen = True
+
+
+class SplitGateway(object):
+    """Split of a case network that calls *routing* each time its incoming
+    arc *start* is triggered. The gateway is a callback on the arc, so no
+    process has to be resumed. Like the split processes it replaces, it
+    routes one zero delay step after the arc and then resets the arc.
+
+    """
+    __slots__ = ('env', 'start', 'routing')
+
+    def __init__(self, env, start, routing):
+        self.env = env
+        self.start = start
+        self.routing = routing
+        start.attach(self._fire)
+
+    def _fire(self, event):
+        self.env.recycled_timeout(0).callbacks.append(self._route)
+
+    def _route(self, event):
+        self.routing()
+        self.start.reset()
+
+
+class JoinGateway(object):
+    """Join of a case network that triggers its outgoing arc once *required*
+    of its incoming arcs have been triggered: all of them for an and-join,
+    one for an xor-join, and for an or-join the number of branches the
+    matching split has activated, which the split sets directly.
+
+    The gateway counts the arrivals in callbacks on the incoming arcs instead
+    of waiting on a new :class:`Condition` each time. Like the join processes
+    it replaces, it triggers the outgoing arc two zero delay steps after the
+    last arrival and then resets the incoming arcs.
+
+    The arcs are connected with :meth:`connect`, which allows an or-split to
+    refer to its join before the join is wired.
+
+    """
+    __slots__ = ('env', 'start_events', 'end', 'required', 'count')
+
+    def __init__(self, env, required=1):
+        self.env = env
+        self.required = required
+        self.count = 0
+
+    def connect(self, start_events, end):
+        """Join the arcs *start_events* into the outgoing arc *end*."""
+        self.start_events = start_events
+        self.end = end
+        for event in start_events:
+            event.attach(self._arrive)
+
+    def _arrive(self, event):
+        self.count += 1
+        if self.count == self.required:
+            self.env.recycled_timeout(0).callbacks.append(self._relay)
+
+    def _relay(self, event):
+        self.env.recycled_timeout(0).callbacks.append(self._fire)
+
+    def _fire(self, event):
+        self.count = 0
+        self.end.succeed()
+        for start in self.start_events:
+            start.reset()
@@ -11,7 +11,10 @@ import random
 
 class NoiseGenerator():
 
-    def __init__(self,traces,noise_percentage):
+    def __init__(self,traces,noise_percentage,seed=None):
+        #a seeded generator draws from its own random instance, it does not depend
+        #on what else draws from the random module
+        self.random = random.Random(seed) if seed is not None else random
         self.resulting_traces = []
         self.no_noisy_traces = 0
         self.resulting_traces = self.add_noise(noise_percentage,traces)
@@ -33,21 +36,21 @@ class NoiseGenerator():
 
     #not used in mixed noise type
     def remove_task(self,trace):
-        act = random.choice(trace)
+        act = self.random.choice(trace)
         trace.remove(act)
         return trace
 
     def duplicate_task(self,trace):
-        random_index = random.randrange(0,len(trace))
+        random_index = self.random.randrange(0,len(trace))
         trace.insert(random_index+1,trace[random_index])
         return trace
 
     def swap_tasks(self,trace):
-        act_1 = random.choice(trace)
+        act_1 = self.random.choice(trace)
         act_2 = act_1
         count = 0
         while act_2 == act_1 and count <10:
-            act_2 = random.choice(trace)
+            act_2 = self.random.choice(trace)
             count += 1
         if count < 10:
             a, b = trace.index(act_1), trace.index(act_2)
@@ -73,44 +76,38 @@ class NoiseGenerator():
         return trace
 
     def add_noise(self,noise_prob, traces):
-        new_traces = []
+        return list(self.iter_noise(noise_prob, traces))
+
+    #adds noise to the traces one at a time and yields them
+    def iter_noise(self,noise_prob, traces):
         for trace in traces:
-            #if the trace contains only one activity, continue
-            if len(trace) <= 1:
-                new_traces.append(trace)
-                continue
-            #draw a random number x
-            x = random.random()
-            #if x is smaller than the noise_prob, add noise
-            if x < noise_prob:
-                self.no_noisy_traces += 1
-                #to implement a mix all noise, randomly choose a noise type
-                noise_type = random.choice(["swap","duplicate","head","body","tail"])
-                if noise_type == "swap":
-                    trace, added = self.swap_tasks(trace)
-                    if added == True:
-                        new_traces.append(trace)
-                    else:
-                        noise_type = random.choice(["duplicate","head","body","tail"])
-                        if noise_type == "duplicate":
-                            new_traces.append(self.duplicate_task(trace))
-                        elif noise_type == "head":
-                            new_traces.append(self.remove_head(trace))
-                        elif noise_type == "body":
-                            new_traces.append(self.remove_body(trace))
-                        elif noise_type == "tail":
-                            new_traces.append(self.remove_tail(trace))
-                elif noise_type == "duplicate":
-                    new_traces.append(self.duplicate_task(trace))
-                elif noise_type == "head":
-                    new_traces.append(self.remove_head(trace))
-                elif noise_type == "body":
-                    new_traces.append(self.remove_body(trace))
-                elif noise_type == "tail":
-                    new_traces.append(self.remove_tail(trace))
-            else:
-                new_traces.append(trace)
-        return new_traces
+            yield self.add_noise_to_trace(noise_prob, trace)
+
+    def add_noise_to_trace(self,noise_prob, trace):
+        #if the trace contains only one activity, continue
+        if len(trace) <= 1:
+            return trace
+        #draw a random number x
+        x = self.random.random()
+        #if x is smaller than the noise_prob, add noise
+        if x < noise_prob:
+            self.no_noisy_traces += 1
+            #to implement a mix all noise, randomly choose a noise type
+            noise_type = self.random.choice(["swap","duplicate","head","body","tail"])
+            if noise_type == "swap":
+                trace, added = self.swap_tasks(trace)
+                if added == True:
+                    return trace
+                noise_type = self.random.choice(["duplicate","head","body","tail"])
+            if noise_type == "duplicate":
+                return self.duplicate_task(trace)
+            elif noise_type == "head":
+                return self.remove_head(trace)
+            elif noise_type == "body":
+                return self.remove_body(trace)
+            elif noise_type == "tail":
+                return self.remove_tail(trace)
+        return trace
 
     def noisy_traces_to_csv(self,fname, traces):
         output = open(fname + "_noise.csv", 'w')
@@ -0,0 +1,201 @@
+# -*- coding: utf-8 -*-
+"""
+Derives the bpsim sequence of a process tree, the simulators translate it into
+their network of arcs, activity processes, splits and joins
+
+The sequence lists the activities and the splits and joins of the operators in
+the order in which the simulators wire them:
+    - (leaf, act_tag, "", start event, end event) for an activity
+    - (operator, "split", children, start event) for a choice, parallel or or
+    - (operator, "join", "", join endpoints) once the last child of the operator
+      that can complete it is done, the join endpoints are the nodes whose
+      outgoing arcs the join waits on
+    - (loop, "join", [start event, end of the middle child], first child) and
+      (loop, "split", "", end of the first child, start events of the middle
+      and right child) for a loop, its split follows once its right child is done
+
+The tree is analysed bottom-up once. Each operator counts the children that can
+complete it (all children of a choice, parallel or or, the last child of a
+sequence or loop), a finished child takes one off the count of its parent and
+the operator is finished when its count reaches zero. Every node is therefore
+visited a constant number of times.
+
+INPUT:
+    newick tree (TreeNode)
+
+OUTPUT:
+    the bpsim sequence, the join endpoints of the operators and the number of
+    arcs the operators need
+"""
+
+class BpsimSequence():
+    '''bpsim sequence of a tree, act_tag is the second field of the activity entries'''
+
+    def __init__(self, tree, act_tag=""):
+        self.t = tree
+        self.act_tag = act_tag
+        self.sequence = []
+        #nodes whose outgoing arcs the join of an operator waits on
+        self.join_endpoints = dict()
+        #arcs of the splits and joins, the start arc and the arcs of the activities
+        #are counted by the simulators
+        self.arcs = 0
+        self.analyse_tree()
+        self.derive_sequence()
+
+    def analyse_tree(self):
+        '''analyses the tree bottom-up in a single pass: the index of each node among its
+        siblings, the number of children that can complete each operator and the node
+        reached by following the last children of sequences and loops'''
+        self.child_index = dict()
+        self.unfinished = dict()
+        self.last_nodes = dict()
+        #memoized start and end events
+        self.startevents = dict()
+        self.endevents = dict()
+
+        for node in self.t.traverse(strategy="postorder"):
+            if node.is_leaf():
+                continue
+            children = node.children
+            for index, child in enumerate(children):
+                self.child_index[child] = index
+            last_child = children[-1]
+            if last_child.name in ["sequence", "loop"]:
+                self.last_nodes[node] = self.last_nodes[last_child]
+            else:
+                self.last_nodes[node] = last_child
+            if node.name in ["sequence", "loop"]:
+                self.unfinished[node] = 1
+            else:
+                self.unfinished[node] = len(children)
+
+    def derive_sequence(self):
+        '''traverses the tree and deduces the sequence of the operators and activities'''
+        for node in self.t.traverse(strategy="preorder"):
+            if node.is_leaf():
+                startevent = self.determine_startevent(node)
+                endevent = self.determine_endevent(node)
+                self.sequence.append((node, self.act_tag, "", startevent, endevent))
+                self.finish(node)
+            else:
+                children = node.get_children()
+                if node.name != "sequence":
+                    self.arcs += len(children)
+                if not node.is_root():
+                    startevent = self.determine_startevent(node)
+                else:
+                    startevent = None
+                if node.name not in ["sequence", "loop"]:
+                    self.join_endpoints[node] = [self.loop_end_left(child) for child in children]
+                    self.sequence.append((node, "split", children, startevent))
+                elif node.name == "loop":
+                    endpoints_middle = []
+                    if children[1].is_leaf():
+                        endpoints_middle.append(children[1])
+                    else:
+                        if children[1].name in ["sequence", "loop"]:
+                            endpoints_middle.append(self.last_nodes[children[1]])
+                        else:
+                            endpoints_middle.append(children[1])
+                        self.join_endpoints[node] = endpoints_middle
+                    self.sequence.append((node, "join", [startevent, endpoints_middle], children[0]))
+
+    def finish(self, node):
+        '''called once the subtree of node is done, adds the joins and loop splits of the
+        operators that node completes, the innermost one first'''
+        ancestor = node.up
+        while ancestor is not None:
+            if ancestor.name in ["sequence", "loop"] and node is not ancestor.children[-1]:
+                return
+            self.unfinished[ancestor] -= 1
+            if self.unfinished[ancestor]:
+                return
+            if ancestor.name == "loop":
+                children = ancestor.get_children()
+                endevents = [self.determine_start_middle(children[1]),
+                             self.determine_start_middle(children[2])]
+                start = self.loop_end_left(children[0])
+                self.sequence.append((ancestor, "split", "", start, endevents))
+            elif ancestor.name != "sequence":
+                self.arcs += 1
+                self.sequence.append((ancestor, "join", "", self.join_endpoints[ancestor]))
+            node = ancestor
+            ancestor = node.up
+
+    #determine startevent of activity
+    def determine_startevent(self, node):
+        try:
+            return self.startevents[node]
+        except KeyError:
+            pass
+        parent = node.up
+        if parent.name in ["choice", "parallel", "or"]:
+            startevent = parent
+        elif parent.name == "sequence":
+            index = self.child_index[node]
+            if index == 0:
+                if parent.is_root():
+                    startevent = None
+                else:
+                    startevent = self.determine_startevent(parent)
+            else:
+                previous_child = parent.children[index-1]
+                if previous_child.name in ["loop", "sequence"]:
+                    startevent = self.last_nodes[previous_child]
+                else:
+                    startevent = previous_child
+        else:
+            if self.child_index[node] == 0:
+                startevent = [parent,"xor-join"]
+            else:
+                startevent = [parent,"xor-split"]
+        self.startevents[node] = startevent
+        return startevent
+
+    def determine_endevent(self, node):
+        try:
+            return self.endevents[node]
+        except KeyError:
+            pass
+        parent = node.up
+        index = self.child_index[node]
+        if parent.name in ["choice", "parallel", "or"]:
+            endevent = parent
+        elif parent.name == "sequence":
+            if index == (len(parent.children) - 1):
+                if parent.is_root():
+                    endevent = None
+                else:
+                    endevent = self.determine_endevent(parent)
+            else:
+                endevent = parent.children[index+1]
+        else:
+            if index == 0:
+                endevent = [parent,"xor-split"]
+            elif index == 1:
+                endevent = [parent,"xor-join"]
+            else:
+                if parent.is_root():
+                    endevent = None
+                else:
+                    endevent = self.determine_endevent(parent)
+        self.endevents[node] = endevent
+        return endevent
+
+    #startevent middle child in loop
+    def determine_start_middle(self, node):
+        if node.name == "loop":
+            return [node,"xor-join"]
+        elif node.name == "sequence":
+            children = node.get_children()
+            return self.determine_start_middle(children[0])
+        else:
+            return node
+
+    #function to determine endpoint left child in loop
+    def loop_end_left(self, node):
+        if node.name in ["sequence", "loop"]:
+            return self.last_nodes[node]
+        else:
+            return node
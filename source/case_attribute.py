@@ -4,6 +4,7 @@ Created on Sat May 20 14:40:03 2017
 
 @author: lucp8356
 """
+import numpy as np
 
 class CaseAttribute():
     def __init__(self,label,type='bool'):
@@ -12,4 +13,45 @@ class CaseAttribute():
         self.type = type
     
     def assign_value(self,value):
-        self.value = value
\ No newline at end of file
+        self.value = value
+
+class CaseAttributeTable():
+    '''
+    values of the case attributes of a batch of cases, drawn at once into one numpy column
+    per attribute: a bool column for boolean attributes and a float column in [0,1) for
+    numerical ones. A case refers to its row by its index in the batch.
+    '''
+
+    def __init__(self, case_attrs, no_cases, generator=np.random):
+        self.attributes = [(attr.name, attr.type) for attr in case_attrs]
+        self.generator = generator
+        self.columns = dict()
+        for name, attr_type in self.attributes:
+            if attr_type == 'bool':
+                self.columns[name] = generator.randint(0, 2, no_cases).astype(bool)
+            else:
+                self.columns[name] = generator.random_sample(no_cases)
+        self.no_cases = no_cases
+
+    def __len__(self):
+        return self.no_cases
+
+    def draw(self, index):
+        '''draws new values for the case at index'''
+        for name, attr_type in self.attributes:
+            if attr_type == 'bool':
+                self.columns[name][index] = self.generator.randint(0, 2)
+            else:
+                self.columns[name][index] = self.generator.random_sample()
+
+    def assign(self, index, name, value):
+        self.columns[name][index] = value
+
+    def values(self, index):
+        '''returns the values of the case at index as a dictionary {name: value}'''
+        return dict((name, self.columns[name][index].item()) for name, attr_type in self.attributes)
+
+    def items(self, index):
+        '''returns the (name, type, value) of each attribute of the case at index'''
+        return [(name, attr_type, self.columns[name][index].item())
+                for name, attr_type in self.attributes]
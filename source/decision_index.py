@@ -0,0 +1,86 @@
+# -*- coding: utf-8 -*-
+"""
+Index of the decision rules of a choice
+
+A rule is a tuple (antecedent, consequent) as in the rules_simulation of
+TreeWithDataDependencies: the antecedent maps the name of a boolean case
+attribute to its value, the name of a numerical case attribute to an interval
+[low, high) and a branch of a previous choice (TreeNode) to True.
+
+The index reduces the inputs of a case to a key: the values of the boolean
+attributes as they are, for each numerical attribute the interval between two
+consecutive bounds of the rules (found with bisect on the sorted bounds) and a
+bitmask of the branch inputs that hold. All cases with the same key match the
+same rules, so the rules are only matched for the first case with a key and
+the next ones look the result up. A lookup takes time in the number of inputs
+of the decision, not in the number of its rules.
+
+INPUT:
+    rules of a decision
+
+OUTPUT:
+    consequents of the rules that match a case, in the order of the rules
+"""
+
+from bisect import bisect_right
+
+
+class DecisionIndex():
+
+    def __init__(self, rules):
+        self.rules = rules
+        self.bool_inputs = []
+        self.node_inputs = []
+        bounds = dict()
+        for antecedent, consequent in rules:
+            for key, value in antecedent.items():
+                if not isinstance(key, basestring):
+                    if key not in self.node_inputs:
+                        self.node_inputs.append(key)
+                elif isinstance(value, bool):
+                    if key not in self.bool_inputs:
+                        self.bool_inputs.append(key)
+                else:
+                    bounds.setdefault(key, set()).update(value)
+        self.numeric_inputs = [(name, sorted(name_bounds)) for name, name_bounds in bounds.items()]
+        #consequents of the matching rules by key
+        self.table = dict()
+
+    def key(self, values, holds):
+        '''returns the key of a case with the given values of its attributes (dict), the
+        branch inputs for which holds(node) is True hold'''
+        mask = 0
+        for bit, node in enumerate(self.node_inputs):
+            if holds(node):
+                mask |= 1 << bit
+        return (tuple([values.get(name) for name in self.bool_inputs]),
+                tuple([bisect_right(name_bounds, values[name]) if name in values else None
+                       for name, name_bounds in self.numeric_inputs]),
+                mask)
+
+    def candidates(self, values, holds):
+        '''returns the consequents of the rules that match the case'''
+        key = self.key(values, holds)
+        try:
+            return self.table[key]
+        except KeyError:
+            consequents = tuple([consequent for antecedent, consequent in self.rules
+                                 if matches(antecedent, values, holds)])
+            self.table[key] = consequents
+            return consequents
+
+def matches(antecedent, values, holds):
+    '''returns True if the attribute values and branch inputs of a case match the antecedent,
+    an attribute the case does not have never matches'''
+    for key, value in antecedent.items():
+        if not isinstance(key, basestring):
+            if not holds(key):
+                return False
+        elif key not in values:
+            return False
+        elif isinstance(value, bool):
+            if values[key] != value:
+                return False
+        elif values[key] < value[0] or values[key] >= value[1]:
+            return False
+    return True
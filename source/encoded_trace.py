@@ -0,0 +1,185 @@
+# -*- coding: utf-8 -*-
+"""
+Integer encoded traces
+
+An encoded trace stores the activities of a case as an array('H') of ids into
+the activity vocabulary of its tree and, when timestamps are recorded, the
+start and end time of each event as seconds since the start of the log in two
+parallel arrays of 64 bit numbers. An event costs 2 or 18 bytes instead of a
+list slot plus a tuple of a label and two isoformat strings. Traces read from
+shared memory hold numpy views of the same types instead of arrays.
+
+The vocabulary of a tree is built from its leaves in preorder, so every process
+that reads the same tree assigns the same ids. The simulators encode their
+traces when they are given a vocabulary, the NoiseGenerator works on encoded
+traces as they are and the writers decode the labels and dates of a trace only
+when they write it.
+
+INPUT:
+    newick tree (TreeNode)
+
+OUTPUT:
+    vocabulary and encoded traces
+"""
+
+import datetime
+from array import array
+
+#64 bit integers, the array module of python 2 has no 'q' and on windows 'l' is
+#only 32 bit, where doubles (which are exact up to 2**53 seconds) are used instead
+TIME_TYPECODE = 'l' if array('l').itemsize >= 8 else 'd'
+
+#ids of an array('H')
+MAX_ACTIVITIES = 2**16
+
+
+class ActivityVocabulary():
+    '''maps the labels of the activities of a tree to consecutive ids, silent
+    activities (tau) have no id'''
+
+    def __init__(self, labels=()):
+        self.labels = []
+        self.ids = dict()
+        for label in labels:
+            self.encode(label)
+
+    @classmethod
+    def from_tree(cls, t):
+        labels = []
+        for leaf in t.get_tree_root().get_leaves():
+            #macro-steps of simplify_tree execute several activities
+            labels.extend(act_name for act_name in getattr(leaf, "activities", [leaf.name])
+                          if act_name != "tau")
+        return cls(labels)
+
+    def encode(self, label):
+        '''returns the id of the label, new labels are added to the vocabulary'''
+        try:
+            return self.ids[label]
+        except KeyError:
+            if len(self.labels) == MAX_ACTIVITIES:
+                raise ValueError("a tree has at most %d distinct activities" % MAX_ACTIVITIES)
+            self.ids[label] = len(self.labels)
+            self.labels.append(label)
+            return self.ids[label]
+
+    def __len__(self):
+        return len(self.labels)
+
+class EncodedTrace(object):
+    '''the events of a case, indexing it gives the activity id of an event, or the
+    tuple (activity id, start, end) when timestamps are recorded, so that it can
+    be handled like a list of events'''
+
+    __slots__ = ("activities", "starts", "ends")
+
+    def __init__(self, activities, starts=None, ends=None):
+        self.activities = activities
+        self.starts = starts
+        self.ends = ends
+
+    @classmethod
+    def from_events(cls, events, timed):
+        '''encodes a list of activity ids, or of (activity id, start, end) tuples when
+        timed'''
+        if not timed:
+            return cls(array('H', events))
+        return cls(array('H', [event[0] for event in events]),
+                   array(TIME_TYPECODE, [event[1] for event in events]),
+                   array(TIME_TYPECODE, [event[2] for event in events]))
+
+    def __reduce__(self):
+        return (EncodedTrace, (self.activities, self.starts, self.ends))
+
+    def __len__(self):
+        return len(self.activities)
+
+    def __iter__(self):
+        if self.starts is None:
+            return iter(self.activities)
+        return iter(zip(self.activities, self.starts, self.ends))
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            if self.starts is None:
+                return EncodedTrace(self.activities[index])
+            return EncodedTrace(self.activities[index], self.starts[index], self.ends[index])
+        if self.starts is None:
+            return self.activities[index]
+        return (self.activities[index], self.starts[index], self.ends[index])
+
+    def __setitem__(self, index, event):
+        self.own()
+        if self.starts is None:
+            self.activities[index] = event
+        else:
+            self.activities[index], self.starts[index], self.ends[index] = event
+
+    def __add__(self, other):
+        self.own()
+        other.own()
+        if self.starts is None:
+            return EncodedTrace(self.activities + other.activities)
+        return EncodedTrace(self.activities + other.activities,
+                            self.starts + other.starts, self.ends + other.ends)
+
+    def index(self, event):
+        self.own()
+        if self.starts is None:
+            return self.activities.index(event)
+        for index, other_event in enumerate(self):
+            if other_event == event:
+                return index
+        raise ValueError("EncodedTrace.index(x): x not in trace")
+
+    def insert(self, index, event):
+        self.own()
+        if self.starts is None:
+            self.activities.insert(index, event)
+        else:
+            self.activities.insert(index, event[0])
+            self.starts.insert(index, event[1])
+            self.ends.insert(index, event[2])
+
+    def remove(self, event):
+        index = self.index(event)
+        self.own()
+        del self.activities[index]
+        if self.starts is not None:
+            del self.starts[index]
+            del self.ends[index]
+
+    def own(self):
+        '''the arrays of a trace read from shared memory are numpy views on memory that
+        other traces share (see shared_traces), they are copied into arrays of the
+        trace itself before it is changed'''
+        if isinstance(self.activities, array):
+            return
+        self.activities = array('H', self.activities.tostring())
+        if self.starts is not None:
+            self.starts = array(TIME_TYPECODE, self.starts.tostring())
+            self.ends = array(TIME_TYPECODE, self.ends.tostring())
+
+    def shift(self, offset):
+        '''moves the start and end times of a timed trace offset seconds forward'''
+        self.starts = array(TIME_TYPECODE, [start_time + offset for start_time in self.starts])
+        self.ends = array(TIME_TYPECODE, [end_time + offset for end_time in self.ends])
+
+    def decode(self, vocabulary, start_date=None):
+        '''returns the trace as a list of labels, or of (label, start, end) tuples with
+        isoformat dates counted from start_date when timed'''
+        labels = vocabulary.labels
+        if self.starts is None:
+            return [labels[activity] for activity in self.activities]
+        return [(labels[activity], add_sec(start_date, start_time).isoformat(),
+                 add_sec(start_date, end_time).isoformat())
+                for activity, start_time, end_time in zip(self.activities, self.starts, self.ends)]
+
+def decode_traces(traces, vocabulary, start_date=None):
+    '''decodes the traces one at a time'''
+    for trace in traces:
+        yield trace.decode(vocabulary, start_date)
+
+def add_sec(time, secs):
+    time = time + datetime.timedelta(seconds=secs)
+    return time
@@ -0,0 +1,91 @@
+# -*- coding: utf-8 -*-
+"""
+Plans for noisy cases that violate a removed decision rule
+
+A noisy case is a case in which at least one of the rules removed from the
+decision tables fires. Instead of simulating cases until this happens by
+chance, a removed rule is picked and the case is made to satisfy its
+antecedent: the case attributes of the antecedent get a value in it (the value
+of a boolean attribute, a uniform value in the interval [low, high) of a
+numerical one) and the choices are forced to route the case to the branches
+of the antecedent and towards the decision of the rule, the ors select the
+children on the way and loops with one of them in their redo part repeat once.
+The rule then fires unless its antecedent does not hold for another reason
+(e.g. a branch input was passed over later), such cases are rejected and
+simulated again.
+
+A plan is a tuple (antecedent, forced branches) where the forced branches map
+a choice node to the index of the child it has to route to, an or node to the
+tuple of the indices of the children it has to select and a loop node to 1
+(its redo child). Rules for which two forced branches exclude each other have
+no plan.
+
+INPUT:
+    process tree (TreeNode)
+    removed rules of each choice (removed_rules_simulation)
+
+OUTPUT:
+    plans of the removed rules
+"""
+
+#forced attempts for a noisy case before it is simulated without forcing
+MAX_FORCED_ATTEMPTS = 100
+
+
+def removed_rule_plans(t, removed_rules):
+    '''returns the plans of the removed rules, in preorder of their decisions'''
+    plans = []
+    for node in t.traverse(strategy="preorder"):
+        for antecedent, consequent in removed_rules.get(node, []):
+            forced = forced_branches(node, antecedent)
+            if forced is not None:
+                plans.append((antecedent, forced))
+    return plans
+
+def forced_branches(decision, antecedent):
+    '''returns the child index (indices for an or) of each choice, or and loop that leads to
+    the decision or to a branch input of the antecedent, None if two of them need different
+    children of a choice'''
+    forced = dict()
+    nodes = [decision] + [key for key in antecedent if not isinstance(key, basestring)]
+    for node in nodes:
+        child = node
+        parent = node.up
+        while parent is not None:
+            if parent.name == "choice":
+                index = parent.children.index(child)
+                if forced.setdefault(parent, index) != index:
+                    return None
+            elif parent.name == "or":
+                index = parent.children.index(child)
+                forced[parent] = tuple(sorted(set(forced.get(parent, ()) + (index,))))
+            elif parent.name == "loop" and parent.children.index(child) == 1:
+                #the redo part is only executed when the loop repeats
+                forced[parent] = 1
+            child = parent
+            parent = parent.up
+    return forced
+
+def forced_selection(children, forced, x, sample):
+    '''returns the x children (at least the forced ones) an or selects, the forced children
+    are completed with a sample of the others'''
+    selected = [children[index] for index in forced]
+    others = [child for index, child in enumerate(children) if index not in forced]
+    return selected + sample(others, max(x - len(selected), 0))
+
+def assign_antecedent(table, index, antecedent, draw):
+    '''assigns the case attributes of the case at index in the table a value that satisfies
+    the antecedent, draw returns the random numbers in [0,1) of the interval values'''
+    for name, value in antecedent.items():
+        if name in table.columns:
+            if isinstance(value, bool):
+                table.assign(index, name, value)
+            else:
+                low, high = value
+                table.assign(index, name, low + (high - low) * draw())
+
+def acceptance_rate(no_noisy_cases, no_attempts):
+    '''share of the simulated attempts that were kept as noisy cases'''
+    if no_attempts == 0:
+        return None
+    return float(no_noisy_cases) / no_attempts
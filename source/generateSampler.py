@@ -0,0 +1,235 @@
+# -*- coding: utf-8 -*-
+"""
+Samples a log given a newick tree with Python code generated for that tree
+
+The tree is translated into the source of a dedicated function: a choice
+becomes an if/elif chain on its precomputed cutoffs, a loop a while loop and
+a leaf an append to the trace. The source is compiled once and cached, so
+sampling a case is a single call without any walk over the tree. The
+generated code draws the same random numbers from the stream of the sampler
+in the same order as the LogSampler, for a given seed both engines produce
+the same log.
+
+INPUT:
+    newick tree string
+    number of cases to sample
+
+OUTPUT:
+    log as a list of traces
+"""
+
+from sampleLog import LogSampler
+
+#python refuses more than 100 levels of indentation and more than 20 nested
+#loops in a function, deeper operators are generated as helper functions
+MAX_INDENT = 60
+MAX_BLOCKS = 15
+
+#the random functions are bound as default arguments, which makes them locals
+RANDOM_ARGUMENTS = "random=random, duration=duration, uniform=uniform, sample=sample"
+
+#compiled code of the samplers by their source
+compiled_samplers = dict()
+
+class CompiledSampler(LogSampler):
+
+    def compile_tree(self):
+        LogSampler.compile_tree(self)
+        self.source = SamplerSourceGenerator(self.program, self.timed).generate()
+        self.sampler = compile_sampler(self.source, self)
+
+    def sample_case(self):
+        if self.timed:
+            events, self.now = self.sampler(self.now)
+            self.record_events(events)
+        else:
+            self.case.trace = self.sampler()
+
+    def dump_source(self, path):
+        source_file = open(path, 'w')
+        source_file.write(self.source)
+        source_file.close()
+
+def compile_sampler(source, sampler):
+    '''compiles the generated source once and returns its sample_case function, which
+    draws from the random functions of the sampler'''
+    try:
+        code = compiled_samplers[source]
+    except KeyError:
+        code = compile(source, "<sampler>", "exec")
+        compiled_samplers[source] = code
+    namespace = dict(random=sampler.random, duration=sampler.duration,
+                     uniform=sampler.uniform, sample=sampler.sample)
+    exec code in namespace
+    return namespace["sample_case"]
+
+class SamplerSourceGenerator():
+    '''translates the program of a LogSampler into python source, a timed
+    program appends (end, start, name) events and returns them with the end
+    time of the case, an untimed program returns the trace'''
+
+    def __init__(self, program, timed):
+        self.program = program
+        self.timed = timed
+        self.functions = []
+        self.variables = 0
+
+    def generate(self):
+        lines = []
+        if self.timed:
+            lines.append("def sample_case(t0, %s):" % RANDOM_ARGUMENTS)
+            lines.append("    events = []")
+            lines.append("    append = events.append")
+            end = self._emit_timed(self.program, "t0", lines, 1, 0)
+            lines.append("    return events, %s" % end)
+        else:
+            lines.append("def sample_case(%s):" % RANDOM_ARGUMENTS)
+            lines.append("    trace = []")
+            lines.append("    append = trace.append")
+            self._emit(self.program, lines, 1, 0)
+            lines.append("    return trace")
+        self.functions.append(lines)
+        return "\n\n".join("\n".join(function) for function in self.functions) + "\n"
+
+    def _variable(self, prefix):
+        self.variables += 1
+        return "%s%d" % (prefix, self.variables)
+
+    #generates program as a helper function when it is nested too deeply
+    def _too_deep(self, program, indent, blocks):
+        return program[0] != "act" and (indent >= MAX_INDENT or blocks >= MAX_BLOCKS)
+
+    def _helper(self, program):
+        name = self._variable("_sample")
+        lines = []
+        if self.timed:
+            lines.append("def %s(t0, append, %s):" % (name, RANDOM_ARGUMENTS))
+            end = self._emit_timed_program(program, "t0", lines, 1, 0)
+            lines.append("    return %s" % end)
+        else:
+            lines.append("def %s(append, %s):" % (name, RANDOM_ARGUMENTS))
+            self._emit_program(program, lines, 1, 0)
+        self.functions.append(lines)
+        return name
+
+    def _emit_block(self, program, lines, indent, blocks):
+        length = len(lines)
+        self._emit(program, lines, indent, blocks)
+        if len(lines) == length:
+            lines.append("    " * indent + "pass")
+
+    def _emit_branches(self, conditions, emit_branch, lines, indent):
+        pad = "    " * indent
+        for i, condition in enumerate(conditions):
+            if i == 0:
+                lines.append(pad + "if %s:" % condition)
+            elif condition is not None:
+                lines.append(pad + "elif %s:" % condition)
+            else:
+                lines.append(pad + "else:")
+            emit_branch(i)
+
+    #code that appends the labels of program to the trace in order of execution
+    def _emit(self, program, lines, indent, blocks):
+        if self._too_deep(program, indent, blocks):
+            lines.append("    " * indent + "%s(append)" % self._helper(program))
+        else:
+            self._emit_program(program, lines, indent, blocks)
+
+    def _emit_program(self, program, lines, indent, blocks):
+        pad = "    " * indent
+        kind = program[0]
+        if kind == "act":
+            if program[1] != "tau":
+                lines.append(pad + "append(%r)" % program[1])
+        elif kind == "sequence":
+            for child in program[1]:
+                self._emit(child, lines, indent, blocks)
+        elif kind == "choice":
+            cutoffs, children = program[1], program[2]
+            lines.append(pad + "r = random()")
+            if not cutoffs:
+                self._emit(children[0], lines, indent, blocks)
+            else:
+                conditions = ["r < %r" % cutoff for cutoff in cutoffs] + [None]
+                emit_branch = lambda i: self._emit_block(children[i], lines, indent + 1, blocks)
+                self._emit_branches(conditions, emit_branch, lines, indent)
+        else:
+            #loop: do, then redo and do again or exit
+            lines.append(pad + "while True:")
+            self._emit(program[1], lines, indent + 1, blocks + 1)
+            lines.append(pad + "    if random() >= 0.5:")
+            lines.append(pad + "        break")
+            self._emit(program[2], lines, indent + 1, blocks + 1)
+            self._emit(program[3], lines, indent, blocks)
+
+    #code that runs program from the time in variable start, returns the variable
+    #that holds the end time
+    def _emit_timed(self, program, start, lines, indent, blocks):
+        if self._too_deep(program, indent, blocks):
+            end = self._variable("t")
+            lines.append("    " * indent + "%s = %s(%s, append)" % (end, self._helper(program), start))
+            return end
+        return self._emit_timed_program(program, start, lines, indent, blocks)
+
+    def _emit_timed_program(self, program, start, lines, indent, blocks):
+        pad = "    " * indent
+        kind = program[0]
+        if kind == "act":
+            end = self._variable("t")
+            lines.append(pad + "%s = %s + duration()" % (end, start))
+            if program[1] != "tau":
+                lines.append(pad + "append((%s, %s, %r))" % (end, start, program[1]))
+            return end
+        elif kind == "sequence":
+            for child in program[1]:
+                start = self._emit_timed(child, start, lines, indent, blocks)
+            return start
+        elif kind == "choice":
+            cutoffs, children = program[1], program[2]
+            lines.append(pad + "r = random()")
+            if not cutoffs:
+                return self._emit_timed(children[0], start, lines, indent, blocks)
+            end = self._variable("t")
+            def emit_branch(i):
+                child_end = self._emit_timed(children[i], start, lines, indent + 1, blocks)
+                lines.append(pad + "    %s = %s" % (end, child_end))
+            conditions = ["r < %r" % cutoff for cutoff in cutoffs] + [None]
+            self._emit_branches(conditions, emit_branch, lines, indent)
+            return end
+        elif kind == "parallel":
+            ends = [self._emit_timed(child, start, lines, indent, blocks) for child in program[1]]
+            if len(ends) == 1:
+                return ends[0]
+            end = self._variable("t")
+            lines.append(pad + "%s = max(%s)" % (end, ", ".join(ends)))
+            return end
+        elif kind == "or":
+            #the selected children are run in the order random.sample returns them
+            children = program[1]
+            end = self._variable("t")
+            index = self._variable("i")
+            lines.append(pad + "%s = %s" % (end, start))
+            lines.append(pad + "for %s in sample(%r, int(round(uniform(1, %d)))):"
+                         % (index, tuple(range(len(children))), len(children)))
+            def emit_branch(i):
+                child_end = self._emit_timed(children[i], start, lines, indent + 2, blocks + 1)
+                lines.append(pad + "        if %s > %s:" % (child_end, end))
+                lines.append(pad + "            %s = %s" % (end, child_end))
+            if len(children) == 1:
+                conditions = ["True"]
+            else:
+                conditions = ["%s == %d" % (index, i) for i in range(len(children) - 1)] + [None]
+            self._emit_branches(conditions, emit_branch, lines, indent + 1)
+            return end
+        else:
+            end = self._variable("t")
+            lines.append(pad + "%s = %s" % (end, start))
+            lines.append(pad + "while True:")
+            do_end = self._emit_timed(program[1], end, lines, indent + 1, blocks + 1)
+            lines.append(pad + "    %s = %s" % (end, do_end))
+            lines.append(pad + "    if random() >= 0.5:")
+            lines.append(pad + "        break")
+            redo_end = self._emit_timed(program[2], end, lines, indent + 1, blocks + 1)
+            lines.append(pad + "    %s = %s" % (end, redo_end))
+            return self._emit_timed(program[3], end, lines, indent, blocks)
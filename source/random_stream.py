@@ -0,0 +1,149 @@
+# -*- coding: utf-8 -*-
+"""
+Random number streams used by the simulators
+
+A simulator draws all its routing decisions and activity durations from a
+stream object instead of calling the random module directly:
+    - random(): float in [0,1)
+    - choice(seq), sample(population, k), uniform(a, b): as in the random module
+    - integers(low, high): function that draws an integer from [low, high]
+    - generator: numpy generator for bulk draws (e.g. by the vectorised mode)
+    - start_case(k): called by the simulators at the start of case k
+
+RandomStream draws every number from the random module, its generator is the
+numpy.random module. The logs are reproducible with random.seed, and with
+numpy.random.seed as well for the engines that make bulk draws (the seed method
+seeds both). The simulators and samplers use it by default.
+BlockRandomStream draws numbers from numpy in blocks and hands them out one at
+a time, it has its own seed and is passed to a simulator explicitly (the log
+plugins select it with --r block). Reseeding it restarts every function it has
+handed out.
+
+CaseRandomStream gives every case its own stream: before case k of a tree is
+simulated, the random module is seeded with case_seed(seed, tree id, k), a
+splitmix64 hash of the three. A case therefore does not depend on the cases
+simulated before it, any case range of a tree can be simulated on its own and
+gives the same traces as in the complete log. The other streams ignore
+start_case. The clock still runs on from one case to the next, so the
+timestamps of a case range start at its first case.
+"""
+
+import random
+import hashlib
+import itertools
+from functools import partial
+import numpy as np
+
+BLOCK_SIZE = 10000
+
+class RandomStream():
+    '''draws every random number with a call to the random module'''
+
+    def __init__(self):
+        self.random = random.random
+        self.choice = random.choice
+        self.sample = random.sample
+        self.uniform = random.uniform
+        self.generator = np.random
+
+    def integers(self, low, high):
+        return partial(random.randint, low, high)
+
+    def seed(self, seed=None):
+        '''seeds the random module and numpy.random'''
+        random.seed(seed)
+        np.random.seed(seed)
+
+    def start_case(self, case_index):
+        pass
+
+class BlockRandomStream(RandomStream):
+    '''draws random numbers from numpy in blocks of block_size numbers, a
+    number only costs a step of an iterator until the block is used up'''
+
+    def __init__(self, seed=None, block_size=BLOCK_SIZE):
+        self.block_size = block_size
+        self.generator = np.random.RandomState(seed)
+        #the block each stream is handing out, in a list of one block per stream
+        self.current_blocks = []
+        self.random = self._stream(self.generator.random_sample)
+        self.integer_streams = dict()
+
+    def seed(self, seed=None):
+        '''restarts the stream in place, the functions handed out before (random and
+        those returned by integers) draw their next block from the reseeded generator'''
+        self.generator.seed(seed)
+        for current_block in self.current_blocks:
+            #an emptied block ends the iteration over it
+            del current_block[0][:]
+
+    def _stream(self, draw):
+        '''returns a function that hands out the numbers of blocks drawn by draw(size)'''
+        current_block = [[]]
+        self.current_blocks.append(current_block)
+        def blocks():
+            while True:
+                current_block[0] = draw(self.block_size).tolist()
+                yield current_block[0]
+        return itertools.chain.from_iterable(blocks()).next
+
+    def integers(self, low, high):
+        try:
+            return self.integer_streams[(low, high)]
+        except KeyError:
+            generator = self.generator
+            stream = self._stream(lambda size: generator.randint(low, high + 1, size))
+            self.integer_streams[(low, high)] = stream
+            return stream
+
+    def choice(self, seq):
+        return seq[int(self.random() * len(seq))]
+
+    def uniform(self, a, b):
+        return a + (b - a) * self.random()
+
+    def sample(self, population, k):
+        #partial fisher-yates shuffle
+        pool = list(population)
+        n = len(pool)
+        for i in range(k):
+            j = i + int(self.random() * (n - i))
+            pool[i], pool[j] = pool[j], pool[i]
+        return pool[:k]
+
+class CaseRandomStream(RandomStream):
+    '''draws every number from the random module, which is seeded at the start of
+    each case with the seed of that case'''
+
+    def __init__(self, seed, tree_id):
+        RandomStream.__init__(self)
+        self.tree_key = tree_key(seed, tree_id)
+        #bulk draws are not split into cases, generate_logs seeds it per shard
+        self.generator = np.random.RandomState(case_seed(seed, tree_id, -1) & MASK32)
+
+    def start_case(self, case_index):
+        random.seed(splitmix64(self.tree_key + case_index))
+
+MASK32 = 2**32 - 1
+MASK64 = 2**64 - 1
+
+def splitmix64(x):
+    '''finalizer of the splitmix64 generator, maps a counter to a well mixed 64 bit number'''
+    x = (x + 0x9E3779B97F4A7C15) & MASK64
+    x = ((x ^ (x >> 30)) * 0xBF58476D1CE4E5B9) & MASK64
+    x = ((x ^ (x >> 27)) * 0x94D049BB133111EB) & MASK64
+    return x ^ (x >> 31)
+
+def tree_key(seed, tree_id):
+    '''key of a tree in a seeded run, the tree id is any string (e.g. the tree index)'''
+    digest = hashlib.md5(str(tree_id)).hexdigest()
+    return splitmix64(splitmix64(seed & MASK64) ^ int(digest[:16], 16))
+
+def case_seed(seed, tree_id, case_index):
+    '''seed of case case_index of a tree, negative indices are free for other
+    streams of the tree (e.g. its noise)'''
+    return splitmix64(tree_key(seed, tree_id) + case_index)
+
+#stream shared by the simulators that are not given one, random.seed seeds it (and
+#numpy.random.seed the bulk draws of its generator)
+default_stream = RandomStream()
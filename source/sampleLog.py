@@ -0,0 +1,181 @@
+# -*- coding: utf-8 -*-
+"""
+Samples a log given a newick tree by walking the tree directly
+
+The sampler follows the semantics of the simpy-based LogSimulator: choices are
+routed by the dist values of their children, loops repeat their middle child
+with probability 0.5 and an or selects int(round(uniform(1,n))) children. The
+interleaving of concurrent branches is decided by the same random activity
+durations the simulator uses, so both engines produce the same distribution
+of traces. There is no event loop: one case is one recursive walk.
+
+INPUT:
+    newick tree string
+    number of cases to sample
+
+OUTPUT:
+    log as a list of traces
+"""
+
+import sys
+sys.path.insert(0, '../newick')
+from tree import TreeNode
+from operator import itemgetter
+from bisect import bisect_right
+import datetime
+from simulateLog import Case, Log
+from random_stream import RandomStream
+from encoded_trace import EncodedTrace
+
+
+class LogSampler():
+
+    def __init__(self,newick_tree,no_cases,record_timestamps,rng=None,first_case=0,vocabulary=None):
+        self.t = TreeNode(newick_tree, format = 1)
+        #the traces are encoded with the activity vocabulary when one is given
+        self.vocabulary = vocabulary
+        #stream of the random numbers, see random_stream
+        self.rng = rng if rng is not None else RandomStream()
+        self.random = self.rng.random
+        self.uniform = self.rng.uniform
+        self.sample = self.rng.sample
+        self.duration = self.rng.integers(1,10000)
+        self.record_timestamps = record_timestamps
+        self.log = Log()
+        self.start_date = datetime.datetime.today()
+        #like the simpy environment, the clock keeps running between cases
+        self.now = 0
+        self.compile_tree()
+
+        for trace in self.iter_traces(no_cases, first_case):
+            self.log.add_trace(trace)
+
+    def iter_traces(self, no_cases, first_case=0):
+        '''samples cases first_case to first_case + no_cases and yields their traces
+        one at a time, without adding them to the log'''
+        for i in xrange(first_case, first_case + no_cases):
+            self.case = Case()
+            self.rng.start_case(i)
+            self.sample_case()
+            yield self.returnTrace()
+
+    def compile_tree(self):
+        '''translates the tree into nested tuples that are cheap to walk:
+        (operator, ...) for operators and ("act", name) for leaves'''
+        self.concurrent = False
+        self.program = self._compile_node(self.t.get_tree_root())
+        #activity durations only matter for the order of the trace when
+        #branches run concurrently or when timestamps have to be recorded
+        self.timed = self.record_timestamps or self.concurrent
+
+    def _compile_node(self, node):
+        if node.is_leaf():
+            if self.vocabulary is not None and node.name != "tau":
+                return ("act", self.vocabulary.encode(node.name))
+            return ("act", node.name)
+        children = node.get_children()
+        programs = [self._compile_node(child) for child in children]
+        if node.name == "sequence":
+            return ("sequence", programs)
+        elif node.name == "choice":
+            #cutoffs of all children except the last, as in xor_routing_generator
+            cutoffs = []
+            previous_cutoff = 0
+            for child in children[:-1]:
+                previous_cutoff = previous_cutoff + child.dist
+                cutoffs.append(previous_cutoff)
+            return ("choice", cutoffs, programs)
+        elif node.name == "loop":
+            return ("loop", programs[0], programs[1], programs[2])
+        else:
+            #parallel and or
+            self.concurrent = True
+            return (node.name, programs)
+
+    def sample_case(self):
+        if self.timed:
+            events = []
+            end = self._walk_timed(self.program, self.now, events)
+            self.record_events(events)
+            self.now = end
+        else:
+            self._walk(self.program, self.case.trace)
+
+    #turns the (end, start, name) events of a timed walk into the trace of the case,
+    #activities are logged when they complete, ties are broken by the start of the activity
+    def record_events(self, events):
+        events.sort(key=itemgetter(0, 1))
+        if self.record_timestamps and self.vocabulary is not None:
+            #encoded traces keep the seconds since the start of the log
+            self.case.trace = [(act_name, start_time, end_time)
+                               for end_time, start_time, act_name in events]
+        elif self.record_timestamps:
+            for end_time, start_time, act_name in events:
+                self.case.trace.append((act_name,
+                                        self.add_sec(self.start_date,start_time).isoformat(),
+                                        self.add_sec(self.start_date,end_time).isoformat()))
+        else:
+            self.case.trace = [event[2] for event in events]
+
+    #walk without time: the trace is built in order of execution
+    def _walk(self, program, trace):
+        kind = program[0]
+        if kind == "act":
+            if program[1] != "tau":
+                trace.append(program[1])
+        elif kind == "sequence":
+            for child in program[1]:
+                self._walk(child, trace)
+        elif kind == "choice":
+            self._walk(program[2][bisect_right(program[1], self.random())], trace)
+        else:
+            #loop: do, then redo and do again or exit
+            self._walk(program[1], trace)
+            while self.random() < 0.5:
+                self._walk(program[2], trace)
+                self._walk(program[1], trace)
+            self._walk(program[3], trace)
+
+    #walk with time: returns the end time of the program started at start
+    def _walk_timed(self, program, start, events):
+        kind = program[0]
+        if kind == "act":
+            end = start + self.dur_a()
+            if program[1] != "tau":
+                events.append((end, start, program[1]))
+            return end
+        elif kind == "sequence":
+            for child in program[1]:
+                start = self._walk_timed(child, start, events)
+            return start
+        elif kind == "choice":
+            child = program[2][bisect_right(program[1], self.random())]
+            return self._walk_timed(child, start, events)
+        elif kind == "parallel":
+            return max([self._walk_timed(child, start, events) for child in program[1]])
+        elif kind == "or":
+            children = program[1]
+            x = int(round(self.uniform(1,len(children))))
+            return max([self._walk_timed(child, start, events)
+                        for child in self.sample(children, x)])
+        else:
+            end = self._walk_timed(program[1], start, events)
+            while self.random() < 0.5:
+                end = self._walk_timed(program[2], end, events)
+                end = self._walk_timed(program[1], end, events)
+            return self._walk_timed(program[3], end, events)
+
+    def dur_a(self):
+        return self.duration()
+
+    def add_sec(self,time,secs):
+        time = time + datetime.timedelta(seconds=secs)
+        return time
+
+    def returnTrace(self):
+        if self.vocabulary is not None:
+            return EncodedTrace.from_events(self.case.trace, self.record_timestamps)
+        return self.case.trace
+
+    def returnLog(self):
+        return self.log.traces
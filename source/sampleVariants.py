@@ -0,0 +1,151 @@
+# -*- coding: utf-8 -*-
+"""
+Samples a log given a newick tree by drawing the number of cases of each variant
+
+The trace variants of the tree and their exact probabilities are computed once
+by composing the variants of the children of each operator, as the paths are
+counted in no_unique_traces: a sequence concatenates the variants of its
+children, a choice mixes them with the probabilities of its children and a loop
+repeats redo and do with probability 0.5 each time. The number of cases of each
+variant is then drawn with a multinomial sample, so the cost of a log depends
+on the number of variants instead of the number of cases.
+
+Variants with a probability below min_probability are dropped while they are
+composed, which bounds the unrolling of loops, and the probabilities of the
+remaining variants are renormalised (the dropped probability is kept in
+dropped_probability). Trees with parallel or or operators are refused because
+the order of concurrent activities depends on their random durations. A
+ValueError is raised for such trees and for trees with more than MAX_VARIANTS
+variants. Timestamps are not supported.
+
+INPUT:
+    newick tree string
+    number of cases to sample
+
+OUTPUT:
+    log as a list of traces
+"""
+
+import sys
+sys.path.insert(0, '../newick')
+from tree import TreeNode
+from array import array
+from simplify_tree import routing_probabilities
+from simulateLog import Log
+from random_stream import default_stream
+from encoded_trace import EncodedTrace
+import numpy as np
+
+#variants of a tree (and of each node) above which the tree is refused
+MAX_VARIANTS = 100000
+MIN_PROBABILITY = 1e-9
+#number of cases of which the variants are drawn and shuffled at once
+BATCH_SIZE = 10000
+
+
+class VariantSampler():
+
+    def __init__(self,newick_tree,no_cases,min_probability=MIN_PROBABILITY,rng=None,
+                 vocabulary=None):
+        self.t = TreeNode(newick_tree, format = 1)
+        #numpy generator of the stream draws the variant counts and the case order
+        self.generator = (rng if rng is not None else default_stream).generator
+        #the traces are encoded with the activity vocabulary when one is given
+        self.vocabulary = vocabulary
+        self.min_probability = min_probability
+        variants = self._variants(self.t.get_tree_root()).items()
+        self.variants = [variant for variant, probability in variants]
+        probabilities = np.array([probability for variant, probability in variants])
+        self.dropped_probability = 1 - probabilities.sum()
+        self.probabilities = probabilities / probabilities.sum()
+        if vocabulary is not None:
+            self.variants = [[vocabulary.encode(act_name) for act_name in variant]
+                             for variant in self.variants]
+        self.log = Log()
+        for trace in self.iter_traces(no_cases):
+            self.log.add_trace(trace)
+
+    def sample_counts(self, no_cases):
+        '''returns the number of cases of each variant, in the order of self.variants'''
+        return self.generator.multinomial(no_cases, self.probabilities)
+
+    def iter_traces(self, no_cases):
+        '''yields the traces of no_cases cases in random order, the variants of each
+        batch of cases are drawn with a multinomial sample and shuffled'''
+        for first_case in range(0, no_cases, BATCH_SIZE):
+            counts = self.sample_counts(min(BATCH_SIZE, no_cases - first_case))
+            cases = np.repeat(np.arange(len(self.variants)), counts)
+            self.generator.shuffle(cases)
+            for variant_index in cases.tolist():
+                #every case gets its own copy, the noise changes traces in place
+                if self.vocabulary is not None:
+                    yield EncodedTrace(array('H', self.variants[variant_index]))
+                else:
+                    yield list(self.variants[variant_index])
+
+    def returnLog(self):
+        return self.log.traces
+
+    #returns a dictionary of the variants (tuples of labels) of node and their probabilities
+    def _variants(self, node):
+        if node.is_leaf():
+            if node.name == "tau":
+                return {(): 1.0}
+            return {(node.name,): 1.0}
+        children = node.get_children()
+        if node.name == "sequence":
+            results = {(): 1.0}
+            for child in children:
+                results = sequence(results, self._variants(child), self.min_probability)
+            return results
+        elif node.name == "choice":
+            results = dict()
+            for child, probability in zip(children, routing_probabilities(children)):
+                if probability > 0:
+                    results = choice(results, self._variants(child), probability,
+                                     self.min_probability)
+            return results
+        elif node.name == "loop":
+            do, redo, exit_ = [self._variants(child) for child in children]
+            return loop(do, redo, exit_, self.min_probability)
+        raise ValueError("the variants of a tree with %s operators depend on the durations "
+                         "of its activities" % node.name)
+
+def check_size(size):
+    if size > MAX_VARIANTS:
+        raise ValueError("the tree has more than %d variants" % MAX_VARIANTS)
+
+def sequence(r, variants, min_probability=0):
+    check_size(len(r) * len(variants))
+    results = dict()
+    for z_r, x_r in r.items():
+        for z_i, x_i in variants.items():
+            x_0 = x_r * x_i
+            if x_0 >= min_probability:
+                z_0 = z_r + z_i
+                results[z_0] = results.get(z_0, 0.0) + x_0
+    return results
+
+def choice(r, variants, probability, min_probability=0):
+    check_size(len(r) + len(variants))
+    results = dict(r)
+    for z_i, x_i in variants.items():
+        x_0 = probability * x_i
+        if x_0 >= min_probability:
+            results[z_i] = results.get(z_i, 0.0) + x_0
+    return results
+
+def loop(do, redo, exit_, min_probability):
+    '''do, followed by i times redo and do, followed by exit, i redos happen with
+    probability 0.5**(i+1), the loop is unrolled until all variants of the next
+    iteration are below min_probability'''
+    repeat = do
+    xor_set = dict()
+    weight = 0.5
+    while repeat:
+        xor_set = choice(xor_set, repeat, weight, min_probability)
+        weight = weight * 0.5
+        #variants of repeat only get less likely, those below the cutoff are dropped early
+        repeat = sequence(sequence(repeat, redo, min_probability / weight), do,
+                          min_probability / weight)
+    return sequence(xor_set, exit_, min_probability)
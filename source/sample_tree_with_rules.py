@@ -0,0 +1,345 @@
+# -*- coding: utf-8 -*-
+"""
+Samples a log given a process tree and a set of decision rules by walking the tree directly
+
+The sampler follows the semantics of the simpy-based LogSimulator of
+simulate_tree_with_rules: the case attributes are drawn at the start of a case,
+a choice routes its case to the branches of the rules that match the case (by
+the probabilities of these branches when several match) and by the dist values
+of its children when no rule matches, a loop repeats its middle child with
+probability 0.5 and an or selects int(round(uniform(1,n))) children. There is
+no event loop: one case is one recursive walk, the order of concurrent
+branches is decided by random activity durations.
+
+The rules of each choice are compiled once per rule set into a DecisionIndex
+(decision_index), which looks up the rules that match the values of the case
+attributes and the branches chosen before in the case. A branch input holds,
+as in the simulator, when the branch was executed in the case and was not
+passed over the last time its choice was routed without a rule. These are
+kept per case as bitmasks of the branches of each choice.
+
+Noisy cases are forced towards a removed rule as in the simulator (see
+forced_noise), a noisy case in which no removed rule fires is sampled again
+from scratch. As in the simulator, the case attributes of a batch of cases are
+drawn at once into the columns of a CaseAttributeTable.
+
+INPUT:
+    process tree (TreeNode with node ids)
+    dictionary of the first leaves of the branches of input choices (choice_first_leaves)
+    rules of each choice (rules_simulation)
+    case attributes
+
+OUTPUT:
+    log with a list of cases
+"""
+
+from operator import itemgetter
+from bisect import bisect_right
+from case_attribute import CaseAttributeTable
+from simulate_tree_with_rules import Case, Log, BATCH_SIZE
+from decision_index import DecisionIndex
+from forced_noise import removed_rule_plans, forced_selection, assign_antecedent, acceptance_rate, \
+    MAX_FORCED_ATTEMPTS
+from random_stream import RandomStream
+from encoded_trace import EncodedTrace
+
+
+class LogSampler():
+
+    def __init__(self,newick_tree,choice_first_leaves,rules,case_attrs,record_timestamps,rng=None,
+                 vocabulary=None):
+        self.t = newick_tree
+        #the traces are encoded with the activity vocabulary when one is given
+        self.vocabulary = vocabulary
+        #stream of the random numbers, see random_stream, its numpy generator draws
+        #the case attributes
+        self.rng = rng if rng is not None else RandomStream()
+        self.duration = self.rng.integers(1,10000)
+        self.choice_first_leaves = choice_first_leaves
+        self.rules = rules
+        self.case_attributes = case_attrs
+        #as in the simulator, the activities of a case are logged without timestamps
+        self.record_timestamps = record_timestamps
+        self.log = Log()
+        self.compile_tree()
+        #compiled decisions of each rule set, by the id of the rule set
+        self.compiled_rules = dict()
+        self.no_noise_attempts = 0
+        self.no_noisy_cases = 0
+
+    def simulate(self,no_cases):
+        '''samples the cases with the rules and adds them to the log object'''
+        for case in self.iter_cases(no_cases):
+            self.log.add_case(case)
+        return self.log
+
+    def simulate_noise(self,no_cases,no_noisy_cases,removed_rules):
+        '''samples cases with the REMOVED rules and adds them to the log object'''
+        for case in self.iter_noisy_cases(no_cases,no_noisy_cases,removed_rules):
+            self.log.add_case(case)
+        return self.log
+
+    def iter_cases(self,no_cases):
+        '''samples the cases with the rules and yields them one at a time'''
+        decisions = self.compile_rules(self.rules)
+        for i, case in enumerate(self._iter_new_cases(no_cases)):
+            self.rng.start_case(i)
+            yield self.sample_case(case, decisions)
+
+    def iter_noisy_cases(self,no_cases,no_noisy_cases,removed_rules):
+        '''samples cases with the REMOVED rules until one of them fires and yields the
+        noisy cases one at a time, the attempts are forced towards a random removed rule
+        until MAX_FORCED_ATTEMPTS of them failed'''
+        decisions = self.compile_rules(removed_rules)
+        plans = []
+        for antecedent, forced in removed_rule_plans(self.t, removed_rules):
+            #forced choices by slot, forced ors and loops by node
+            plans.append((antecedent, dict((self.choice_slots.get(node, node), index)
+                                           for node, index in forced.items())))
+        for i, case in enumerate(self._iter_new_cases(no_noisy_cases)):
+            # the noisy cases are numbered after the fitting cases
+            self.rng.start_case(no_cases + i)
+            attempts = 0
+            while (case.no_rules_fired == 0):
+                if attempts > 0:
+                    case.attributes.draw(case.index)
+                if plans and attempts < MAX_FORCED_ATTEMPTS:
+                    self.sample_case(case, decisions, self.rng.choice(plans))
+                else:
+                    self.sample_case(case, decisions)
+                attempts += 1
+            self.no_noise_attempts += attempts
+            self.no_noisy_cases += 1
+            yield case
+
+    def _iter_new_cases(self,no_cases):
+        '''yields no_cases new cases, the case attributes of each batch of BATCH_SIZE cases
+        are drawn at once with the numpy generator of the stream'''
+        for first_case in range(0, no_cases, BATCH_SIZE):
+            table = CaseAttributeTable(self.case_attributes, min(BATCH_SIZE, no_cases - first_case),
+                                       self.rng.generator)
+            for index in range(len(table)):
+                yield Case(table, index)
+
+    def noise_acceptance_rate(self):
+        '''share of the sampled noisy attempts in which a removed rule fired'''
+        return acceptance_rate(self.no_noisy_cases, self.no_noise_attempts)
+
+    def compile_tree(self):
+        '''translates the tree into nested tuples that are cheap to walk:
+        (operator, ...) for operators and ("act", name, choice label, event) for leaves,
+        where event is the name or, with a vocabulary, the id that is logged in the trace,
+        every choice gets a slot for its routing state'''
+        self.concurrent = False
+        self.choice_slots = dict()
+        #slot and bit of the branch of a choice that starts with a given node
+        self.entries = dict()
+        self.candidate_tables = dict()
+        self.program = self._compile_node(self.t.get_tree_root())
+
+    def _compile_node(self, node):
+        if node.is_leaf():
+            event = node.name
+            if self.vocabulary is not None and node.name != "tau":
+                event = self.vocabulary.encode(node.name)
+            return ("act", node.name, self.choice_first_leaves.get(getattr(node, "id", None)), event)
+        children = node.get_children()
+        if node.name == "choice":
+            slot = len(self.choice_slots)
+            self.choice_slots[node] = slot
+            for index, child in enumerate(children):
+                #the branch is entered by the first node that is not a sequence
+                while child.name == "sequence":
+                    child = child.children[0]
+                self.entries[child] = (slot, 1 << index)
+        programs = [self._compile_node(child) for child in children]
+        if node.name == "sequence":
+            return ("sequence", programs)
+        elif node.name == "choice":
+            probabilities = [child.dist for child in children]
+            return ("choice", slot, self._cumulative_cutoffs(probabilities), programs, probabilities)
+        elif node.name == "loop":
+            return ("loop", programs[0], programs[1], programs[2], node)
+        else:
+            #parallel and or
+            self.concurrent = True
+            return (node.name, programs, node)
+
+    def compile_rules(self, rules):
+        '''returns the decision of each choice slot for the given rules: the index of its
+        rules and the index of the branch of each consequent, or None without rules'''
+        try:
+            return self.compiled_rules[id(rules)][1]
+        except KeyError:
+            pass
+        decisions = [None] * len(self.choice_slots)
+        for node, node_rules in rules.items():
+            if node_rules:
+                branches = dict((consequent, self._branch_index(node, consequent))
+                                for antecedent, consequent in node_rules)
+                decisions[self.choice_slots[node]] = (DecisionIndex(node_rules), branches)
+        #the rule set is kept with its decisions, so that its id is not reused
+        self.compiled_rules[id(rules)] = (rules, decisions)
+        return decisions
+
+    def _branch_index(self, choice, node):
+        '''index of the child of the choice that contains node'''
+        while node.up is not choice:
+            node = node.up
+        return choice.children.index(node)
+
+    def sample_case(self, case, decisions, plan=None):
+        '''samples the trace of the case with the given decisions and returns the case, a plan
+        (antecedent, forced child index of each choice slot) forces the case towards a removed
+        rule'''
+        case.trace = []
+        case.choice_attrs = []
+        if plan is not None:
+            assign_antecedent(case.attributes, case.index, plan[0], self.rng.random)
+            self.forced = plan[1]
+        else:
+            self.forced = dict()
+        self.repeated_loops = set()
+        self.case = case
+        self.decisions = decisions
+        self.values = case.attribute_values()
+        #branches of each choice that were executed and that were not passed over
+        #by the last routing without a rule
+        self.executed = [0] * len(self.choice_slots)
+        self.last_chosen = [-1] * len(self.choice_slots)
+        if self.concurrent:
+            events = []
+            self._walk_timed(self.program, 0, events)
+            #activities are logged when they complete, ties are broken by the start of the activity
+            events.sort(key=itemgetter(0, 1))
+            for end_time, start_time, program in events:
+                self._record(program)
+        else:
+            self._walk(self.program)
+        if self.vocabulary is not None:
+            case.trace = EncodedTrace.from_events(case.trace, False)
+        return case
+
+    def _record(self, program):
+        kind, act_name, label, event = program
+        if act_name != "tau":
+            self.case.trace.append(event)
+        if label is not None:
+            self.case.choice_attrs.append(('choice_' + str(label), act_name))
+
+    def _route(self, program):
+        '''returns the index of the child a choice routes the case to'''
+        slot = program[1]
+        if slot in self.forced:
+            index = self.forced[slot]
+            self.last_chosen[slot] = 1 << index
+            self.executed[slot] |= 1 << index
+            return index
+        decision = self.decisions[slot]
+        if decision is not None:
+            index, branches = decision
+            candidates = [branches[consequent]
+                          for consequent in index.candidates(self.values, self._holds)]
+        else:
+            candidates = []
+        if len(candidates) > 0:
+            self.case.no_rules_fired += 1
+            if len(candidates) < 2:
+                index = candidates[0]
+            else:
+                index = candidates[bisect_right(self._candidate_cutoffs(program, candidates),
+                                                self.rng.random())]
+        else:
+            index = bisect_right(program[2], self.rng.random())
+            self.last_chosen[slot] = 1 << index
+        self.executed[slot] |= 1 << index
+        return index
+
+    def _holds(self, node):
+        '''returns True if the branch input of node holds in the case'''
+        try:
+            slot, bit = self.entries[node]
+        except KeyError:
+            return False
+        return self.executed[slot] & self.last_chosen[slot] & bit != 0
+
+    def _candidate_cutoffs(self, program, candidates):
+        '''normalised cutoffs of the branches of a combination of candidates, every
+        combination is only computed once'''
+        key = (program[1], tuple(candidates))
+        try:
+            return self.candidate_tables[key]
+        except KeyError:
+            probabilities = [program[4][c] for c in candidates]
+            total = sum(probabilities)
+            cutoffs = self._cumulative_cutoffs([p / total for p in probabilities])
+            self.candidate_tables[key] = cutoffs
+            return cutoffs
+
+    def _cumulative_cutoffs(self,probabilities):
+        '''return the cumulative probabilities of all but the last path, ready for bisect'''
+        cutoffs = []
+        previous_cutoff = 0
+        for p in probabilities[:-1]:
+            previous_cutoff = previous_cutoff + p
+            cutoffs.append(previous_cutoff)
+        return cutoffs
+
+    #walk without time: the trace is built in order of execution
+    def _walk(self, program):
+        kind = program[0]
+        if kind == "act":
+            self._record(program)
+        elif kind == "sequence":
+            for child in program[1]:
+                self._walk(child)
+        elif kind == "choice":
+            self._walk(program[3][self._route(program)])
+        else:
+            #loop: do, then redo and do again or exit
+            self._walk(program[1])
+            while self._repeat(program[4]):
+                self._walk(program[2])
+                self._walk(program[1])
+            self._walk(program[3])
+
+    #walk with time: returns the end time of the program started at start
+    def _walk_timed(self, program, start, events):
+        kind = program[0]
+        if kind == "act":
+            end = start + self.dur_a()
+            events.append((end, start, program))
+            return end
+        elif kind == "sequence":
+            for child in program[1]:
+                start = self._walk_timed(child, start, events)
+            return start
+        elif kind == "choice":
+            return self._walk_timed(program[3][self._route(program)], start, events)
+        elif kind == "parallel":
+            return max([self._walk_timed(child, start, events) for child in program[1]])
+        elif kind == "or":
+            children = program[1]
+            x = int(round(self.rng.uniform(1,len(children))))
+            if program[2] in self.forced:
+                selected = forced_selection(children, self.forced[program[2]], x, self.rng.sample)
+            else:
+                selected = self.rng.sample(children, x)
+            return max([self._walk_timed(child, start, events) for child in selected])
+        else:
+            end = self._walk_timed(program[1], start, events)
+            while self._repeat(program[4]):
+                end = self._walk_timed(program[2], end, events)
+                end = self._walk_timed(program[1], end, events)
+            return self._walk_timed(program[3], end, events)
+
+    def _repeat(self, node):
+        '''returns True if the loop repeats, a loop that is forced to repeat for a noisy
+        case does so the first time'''
+        if node in self.forced and node not in self.repeated_loops:
+            self.repeated_loops.add(node)
+            return True
+        return self.rng.random() < 0.5
+
+    def dur_a(self):
+        return self.duration()
@@ -0,0 +1,168 @@
+# -*- coding: utf-8 -*-
+"""
+Passes encoded traces from a worker process to the parent through shared memory
+
+A worker writes the encoded traces it simulates straight into files in shared
+memory (/dev/shm, the temporary folder where there is none), one file per flat
+array: the number of events of each trace, the activity ids of all events and,
+when they are recorded, the start and end times of all events. The files are
+mapped into memory and their size is doubled whenever an array is full. Only
+the metadata of the files (their path, the number of traces and events and
+whether the traces are timed) goes back through the result pipe of the pool.
+
+The parent maps the files and yields traces whose arrays are views on the
+mapped memory, so the events are not copied on either side. The files are
+removed as soon as they are mapped, the memory is released once the last trace
+that refers to it is gone. EncodedTrace copies the arrays of a trace only when
+the trace is changed (e.g. by the noise).
+
+Python 2 has no multiprocessing.shared_memory, files on a tmpfs are the shared
+memory blocks that both processes map.
+
+INPUT:
+    encoded traces
+
+OUTPUT:
+    metadata of the shared memory files and the encoded traces read from them
+"""
+
+import os
+import mmap
+import tempfile
+import numpy as np
+from encoded_trace import EncodedTrace, TIME_TYPECODE
+
+SHARED_FOLDER = "/dev/shm" if os.path.isdir("/dev/shm") else tempfile.gettempdir()
+
+#number of values a shared array has room for when it is created
+INITIAL_CAPACITY = 4096
+
+#the file of the trace lengths has the path of the metadata, the other arrays
+#are in files with these suffixes
+ARRAY_SUFFIXES = (".activities", ".starts", ".ends")
+
+
+class SharedArray():
+    '''array of a numpy type in a file in shared memory, the file is mapped into
+    memory and doubled in size whenever the array is full'''
+
+    def __init__(self, path, dtype, capacity=INITIAL_CAPACITY):
+        self.dtype = np.dtype(dtype)
+        self.size = 0
+        self.file = open(path, 'w+b')
+        self.buffer = None
+        self.map(capacity)
+
+    def map(self, capacity):
+        '''resizes the file to capacity values and maps it again, the values that
+        were written stay where they are in the file'''
+        self.values = None
+        if self.buffer is not None:
+            self.buffer.close()
+        self.capacity = capacity
+        self.file.truncate(capacity * self.dtype.itemsize)
+        self.buffer = mmap.mmap(self.file.fileno(), capacity * self.dtype.itemsize)
+        self.values = np.frombuffer(self.buffer, self.dtype)
+
+    def append(self, value):
+        if self.size == self.capacity:
+            self.map(2 * self.capacity)
+        self.values[self.size] = value
+        self.size += 1
+
+    def extend(self, values):
+        '''appends an array (or any buffer) of values of the same type'''
+        end = self.size + len(values)
+        if end == self.size:
+            return
+        if end > self.capacity:
+            self.map(max(end, 2 * self.capacity))
+        self.values[self.size:end] = np.frombuffer(values, self.dtype)
+        self.size = end
+
+    def close(self):
+        '''unmaps the array and cuts its file to the values that were written'''
+        self.values = None
+        self.buffer.close()
+        self.file.truncate(self.size * self.dtype.itemsize)
+        self.file.close()
+
+
+def write_shared_traces(traces):
+    '''writes the encoded traces to new shared memory files, returns the tuple (path,
+    number of traces, number of events, timed) that is passed to read_shared_traces'''
+    fd, path = tempfile.mkstemp(prefix="traces_", dir=SHARED_FOLDER)
+    os.close(fd)
+    arrays = []
+    try:
+        lengths = SharedArray(path, np.int64)
+        arrays.append(lengths)
+        activities = SharedArray(path + ".activities", np.uint16)
+        arrays.append(activities)
+        starts = ends = None
+        for trace in traces:
+            lengths.append(len(trace))
+            activities.extend(trace.activities)
+            if trace.starts is not None:
+                if starts is None:
+                    starts = SharedArray(path + ".starts", TIME_TYPECODE)
+                    arrays.append(starts)
+                    ends = SharedArray(path + ".ends", TIME_TYPECODE)
+                    arrays.append(ends)
+                starts.extend(trace.starts)
+                ends.extend(trace.ends)
+        shared = (path, lengths.size, activities.size, starts is not None)
+    except:
+        for shared_array in arrays:
+            shared_array.close()
+        remove_shared_traces((path, 0, 0, False))
+        raise
+    for shared_array in arrays:
+        shared_array.close()
+    return shared
+
+def map_shared_array(path, dtype, size):
+    '''maps the file of a shared array and returns the array as a view on it'''
+    if size == 0:
+        #an empty file cannot be mapped
+        return np.zeros(0, dtype)
+    shared_file = open(path, 'r+b')
+    try:
+        buffer = mmap.mmap(shared_file.fileno(), 0)
+    finally:
+        shared_file.close()
+    #the view keeps the map open
+    return np.frombuffer(buffer, dtype, size)
+
+def read_shared_traces(shared, offset=0):
+    '''yields the encoded traces of shared memory files as views on the mapped files,
+    the times of timed traces are moved offset seconds forward'''
+    path, no_traces, no_events, timed = shared
+    try:
+        lengths = map_shared_array(path, np.int64, no_traces)
+        activities = map_shared_array(path + ".activities", np.uint16, no_events)
+        if timed:
+            starts = map_shared_array(path + ".starts", TIME_TYPECODE, no_events)
+            ends = map_shared_array(path + ".ends", TIME_TYPECODE, no_events)
+            if offset:
+                starts += offset
+                ends += offset
+    finally:
+        #the maps stay valid after their files are removed
+        remove_shared_traces(shared)
+    first_event = 0
+    for length in lengths.tolist():
+        last_event = first_event + length
+        if timed:
+            yield EncodedTrace(activities[first_event:last_event],
+                               starts[first_event:last_event], ends[first_event:last_event])
+        else:
+            yield EncodedTrace(activities[first_event:last_event])
+        first_event = last_event
+
+def remove_shared_traces(shared):
+    '''removes the shared memory files of traces that are not read'''
+    path = shared[0]
+    for array_path in [path] + [path + suffix for suffix in ARRAY_SUFFIXES]:
+        if os.path.exists(array_path):
+            os.remove(array_path)
@@ -0,0 +1,140 @@
+# -*- coding: utf-8 -*-
+"""
+Simplifies a process tree before it is translated into a simulation model
+
+The pass rewrites the tree in place without changing the distribution of the
+traces it produces:
+    - nested sequences and nested parallels are flattened into their parent
+    - nested choices are flattened, the probabilities of the inner children
+      are multiplied with the probability of the inner choice
+    - tau leaves are removed from sequences when timestamps are not recorded
+      and the sequence cannot run concurrently with another branch
+    - maximal runs of leaves in a sequence are fused into one macro-step leaf
+    - sequences with a single child are replaced by that child
+
+Macro-step leaves get the features 'activities' (the fused labels, in order)
+and 'instant'. An instant leaf may be executed without advancing the clock,
+which is only the case when time can neither be observed through timestamps
+nor decide the order of concurrent branches. Single leaves in such a context
+are marked as instant macro-steps as well.
+
+INPUT:
+    newick tree (TreeNode)
+    whether timestamps are recorded
+
+OUTPUT:
+    the simplified tree (the root node is kept)
+"""
+
+import sys
+sys.path.insert(0, '../newick')
+from tree import TreeNode
+
+
+def simplify_tree(t, record_timestamps):
+    root = t.get_tree_root()
+    _simplify(root, False, record_timestamps)
+    return root
+
+#returns the node that takes the place of node in its parent
+def _simplify(node, concurrent, record_timestamps):
+    instant = not (concurrent or record_timestamps)
+    if node.is_leaf():
+        if instant:
+            node.add_features(activities=[node.name], instant=True)
+        return node
+
+    children_concurrent = concurrent or node.name in ["parallel", "or"]
+    children = [_simplify(child, children_concurrent, record_timestamps)
+                for child in node.children]
+
+    if node.name in ["sequence", "parallel"]:
+        children = _flatten(node.name, children)
+    elif node.name == "choice":
+        children = _flatten_choice(children)
+
+    if node.name == "sequence":
+        if instant:
+            children = _drop_silent_steps(children)
+        children = _fuse_leaves(children, instant)
+
+    node.children = children
+    for child in children:
+        child.up = node
+
+    if node.name == "sequence" and len(children) == 1 and not node.is_root():
+        child = children[0]
+        child.dist = node.dist
+        return child
+    return node
+
+def _flatten(operator, children):
+    flat_children = []
+    for child in children:
+        if not child.is_leaf() and child.name == operator:
+            flat_children.extend(child.children)
+        else:
+            flat_children.append(child)
+    return flat_children
+
+def _flatten_choice(children):
+    if not [child for child in children if not child.is_leaf() and child.name == "choice"]:
+        return children
+    flat_children = []
+    for child, probability in zip(children, routing_probabilities(children)):
+        if not child.is_leaf() and child.name == "choice":
+            for grandchild, inner_probability in zip(child.children,
+                                                     routing_probabilities(child.children)):
+                grandchild.dist = probability * inner_probability
+                flat_children.append(grandchild)
+        else:
+            child.dist = probability
+            flat_children.append(child)
+    return flat_children
+
+#probabilities with which the xor routing of a choice selects its children:
+#all children but the last are chosen by their cumulative dist, the last takes the rest
+def routing_probabilities(children):
+    probabilities = []
+    previous_cutoff = 0
+    for child in children[:-1]:
+        cutoff = previous_cutoff + child.dist
+        probabilities.append(_clip(cutoff) - _clip(previous_cutoff))
+        previous_cutoff = cutoff
+    probabilities.append(1 - _clip(previous_cutoff))
+    return probabilities
+
+def _clip(cutoff):
+    return min(max(cutoff, 0), 1)
+
+#a sequence keeps at least one child
+def _drop_silent_steps(children):
+    visible_children = [child for child in children
+                        if not (child.is_leaf() and child.name == "tau")]
+    if visible_children:
+        return visible_children
+    return children[:1]
+
+def _fuse_leaves(children, instant):
+    fused_children = []
+    run = []
+    for child in children + [None]:
+        if child is not None and child.is_leaf():
+            run.append(child)
+            continue
+        if len(run) > 1:
+            fused_children.append(_macro_step(run, instant))
+        else:
+            fused_children.extend(run)
+        run = []
+        if child is not None:
+            fused_children.append(child)
+    return fused_children
+
+def _macro_step(leaves, instant):
+    activities = []
+    for leaf in leaves:
+        activities.extend(getattr(leaf, "activities", [leaf.name]))
+    macro_step = TreeNode(name="+".join(activities))
+    macro_step.add_features(activities=activities, instant=instant)
+    return macro_step
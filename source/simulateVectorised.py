@@ -0,0 +1,265 @@
+# -*- coding: utf-8 -*-
+"""
+Simulates a log given a newick tree for all cases at once with numpy
+
+Instead of simulating one case after the other, every operator is executed
+for the whole batch of cases that reaches it: a choice draws the routing of
+all its cases with one numpy call, a loop repeats for the cases that did not
+exit yet. The events of a node are kept as ragged arrays, the number of
+events of each case and the flat arrays of their labels (and start and end
+times when time matters), ordered by case. Sequences concatenate these
+arrays per case.
+
+The semantics are those of the LogSimulator: activities take a random
+duration of 1 to 10000 seconds and are logged when they complete, an or
+selects int(round(uniform(1,n))) children and the clock keeps running from
+one case to the next.
+
+INPUT:
+    newick tree (TreeNode)
+    number of cases to simulate
+
+OUTPUT:
+    log as a list of traces
+"""
+
+import datetime
+import numpy as np
+from array import array
+from encoded_trace import ActivityVocabulary, EncodedTrace, TIME_TYPECODE
+
+
+class VectorisedSimulator():
+
+    def __init__(self,t,no_cases,record_timestamps,generator=np.random,vocabulary=None):
+        self.t = t
+        #numpy random generator (or the numpy.random module) for all draws
+        self.generator = generator
+        self.record_timestamps = record_timestamps
+        self.start_date = datetime.datetime.today()
+        #the traces are encoded when a vocabulary is given, the label ids are then its ids
+        self.encoded = vocabulary is not None
+        self.vocabulary = vocabulary if vocabulary is not None else ActivityVocabulary()
+        #the clock keeps running from one call of simulate to the next
+        self.now = 0
+        self.compile_tree()
+        self.traces = self.simulate(no_cases)
+
+    def compile_tree(self):
+        '''translates the tree into nested tuples: (operator, ...) for operators
+        and ("act", label ids) for leaves, silent activities get label id -1'''
+        self.concurrent = False
+        self.program = self._compile_node(self.t.get_tree_root())
+        #activity durations only matter for the order of the trace when
+        #branches run concurrently or when timestamps have to be recorded
+        self.timed = self.record_timestamps or self.concurrent
+
+    def _compile_node(self, node):
+        if node.is_leaf():
+            #macro-steps of simplify_tree execute several activities
+            act_names = getattr(node, "activities", [node.name])
+            return ("act", np.array([self._label_id(act_name) for act_name in act_names]))
+        children = node.get_children()
+        programs = [self._compile_node(child) for child in children]
+        if node.name == "sequence":
+            return ("sequence", programs)
+        elif node.name == "choice":
+            #cutoffs of all children except the last, as in xor_routing_generator
+            cutoffs = []
+            previous_cutoff = 0
+            for child in children[:-1]:
+                previous_cutoff = previous_cutoff + child.dist
+                cutoffs.append(previous_cutoff)
+            return ("choice", np.array(cutoffs), programs)
+        elif node.name == "loop":
+            return ("loop", programs[0], programs[1], programs[2])
+        else:
+            #parallel and or
+            self.concurrent = True
+            return (node.name, programs)
+
+    def _label_id(self, act_name):
+        if act_name == "tau":
+            return -1
+        return self.vocabulary.encode(act_name)
+
+    def simulate(self, no_cases):
+        labels = np.array(self.vocabulary.labels, dtype=object)
+        starts = ends = None
+        if self.timed:
+            lengths, label_ids, starts, ends, case_ends = self._walk_timed(self.program,
+                                                                           np.zeros(no_cases, dtype=np.int64))
+            case_ids = np.repeat(np.arange(no_cases), lengths)
+            #activities are logged when they complete, ties are broken by the start
+            #of the activity and then by the order in which they were executed
+            order = np.lexsort((starts, ends, case_ids))
+            label_ids = label_ids[order]
+            if self.record_timestamps:
+                #the clock keeps running, a case starts when the previous one ends
+                clock = self.now + np.cumsum(case_ends) - case_ends
+                self.now += int(case_ends.sum())
+                starts = starts[order] + clock[case_ids]
+                ends = ends[order] + clock[case_ids]
+            else:
+                #the times only decided the order of the events
+                starts = ends = None
+        else:
+            lengths, label_ids = self._walk(self.program, no_cases)
+        if self.encoded:
+            return encode_cases(lengths, label_ids, starts, ends)
+        if starts is not None:
+            events = [(act_name, self.add_sec(self.start_date,start_time).isoformat(),
+                       self.add_sec(self.start_date,end_time).isoformat())
+                      for act_name, start_time, end_time
+                      in zip(labels[label_ids].tolist(), starts.tolist(), ends.tolist())]
+        else:
+            events = labels[label_ids].tolist()
+        offsets = np.cumsum(lengths).tolist()
+        return [events[offset - length:offset] for offset, length in zip(offsets, lengths.tolist())]
+
+    #walk without time for no_cases cases: returns the number of events of each
+    #case and their labels
+    def _walk(self, program, no_cases):
+        kind = program[0]
+        if kind == "act":
+            label_ids = program[1][program[1] >= 0]
+            return (np.repeat(len(label_ids), no_cases), np.tile(label_ids, no_cases))
+        elif kind == "sequence":
+            return concatenate([self._walk(child, no_cases) for child in program[1]], no_cases)
+        elif kind == "choice":
+            selected = np.searchsorted(program[1], self.generator.random_sample(no_cases), side='right')
+            parts = []
+            for index, child in enumerate(program[2]):
+                cases = np.flatnonzero(selected == index)
+                parts.append(lift(self._walk(child, len(cases)), cases, no_cases))
+            return concatenate(parts, no_cases)
+        else:
+            #loop: do, then redo and do again for the cases that continue, exit
+            parts = [self._walk(program[1], no_cases)]
+            cases = np.arange(no_cases)
+            while True:
+                cases = cases[self.generator.random_sample(len(cases)) < 0.5]
+                if len(cases) == 0:
+                    break
+                parts.append(lift(self._walk(program[2], len(cases)), cases, no_cases))
+                parts.append(lift(self._walk(program[1], len(cases)), cases, no_cases))
+            parts.append(self._walk(program[3], no_cases))
+            return concatenate(parts, no_cases)
+
+    #walk with time for the cases that start at the given times: returns the number
+    #of events of each case, their labels, start and end times and the end of each case
+    def _walk_timed(self, program, start):
+        no_cases = len(start)
+        kind = program[0]
+        if kind == "act":
+            label_ids = program[1]
+            durations = self.generator.randint(1, 10001, size=(no_cases, len(label_ids)))
+            ends = start[:, np.newaxis] + np.cumsum(durations, axis=1)
+            visible = label_ids >= 0
+            return (np.repeat(np.count_nonzero(visible), no_cases),
+                    np.tile(label_ids[visible], no_cases),
+                    (ends - durations)[:, visible].ravel(),
+                    ends[:, visible].ravel(),
+                    ends[:, -1])
+        elif kind == "sequence":
+            parts = []
+            for child in program[1]:
+                part = self._walk_timed(child, start)
+                parts.append(part[:4])
+                start = part[4]
+            return concatenate(parts, no_cases) + (start,)
+        elif kind == "choice":
+            selected = np.searchsorted(program[1], self.generator.random_sample(no_cases), side='right')
+            return self._walk_selected(program[2], start, selected[:, np.newaxis] == np.arange(len(program[2])))
+        elif kind == "parallel":
+            return self._walk_selected(program[1], start, np.ones((no_cases, len(program[1])), dtype=bool))
+        elif kind == "or":
+            #every case selects int(round(uniform(1,n))) children at random
+            n = len(program[1])
+            no_selected = np.floor(self.generator.uniform(1, n, no_cases) + 0.5)
+            ranks = np.argsort(np.argsort(self.generator.random_sample((no_cases, n)), axis=1), axis=1)
+            return self._walk_selected(program[1], start, ranks < no_selected[:, np.newaxis])
+        else:
+            #loop: do, then redo and do again for the cases that continue, exit
+            part = self._walk_timed(program[1], start)
+            parts = [part[:4]]
+            end = part[4].copy()
+            cases = np.arange(no_cases)
+            while True:
+                cases = cases[self.generator.random_sample(len(cases)) < 0.5]
+                if len(cases) == 0:
+                    break
+                for child in (program[2], program[1]):
+                    part = self._walk_timed(child, end[cases])
+                    parts.append(lift(part[:4], cases, no_cases))
+                    end[cases] = part[4]
+            part = self._walk_timed(program[3], end)
+            parts.append(part[:4])
+            return concatenate(parts, no_cases) + (part[4],)
+
+    #runs each child for the cases that selected it, all of them from the start of
+    #the case, a case ends when all its selected children have ended
+    def _walk_selected(self, children, start, selected):
+        no_cases = len(start)
+        parts = []
+        end = start.copy()
+        for index, child in enumerate(children):
+            cases = np.flatnonzero(selected[:, index])
+            part = self._walk_timed(child, start[cases])
+            parts.append(lift(part[:4], cases, no_cases))
+            end[cases] = np.maximum(end[cases], part[4])
+        return concatenate(parts, no_cases) + (end,)
+
+    def add_sec(self,time,secs):
+        time = time + datetime.timedelta(seconds=secs)
+        return time
+
+    def returnLog(self):
+        return self.traces
+
+def encode_cases(lengths, label_ids, starts=None, ends=None):
+    '''splits the ragged arrays of the events of all cases into encoded traces'''
+    activities = label_ids.astype(np.uint16).tostring()
+    if starts is not None:
+        starts = starts.astype(TIME_TYPECODE).tostring()
+        ends = ends.astype(TIME_TYPECODE).tostring()
+    time_size = array(TIME_TYPECODE).itemsize
+    traces = []
+    offset = 0
+    for length in lengths.tolist():
+        end = offset + length
+        if starts is None:
+            traces.append(EncodedTrace(array('H', activities[2 * offset:2 * end])))
+        else:
+            traces.append(EncodedTrace(array('H', activities[2 * offset:2 * end]),
+                                       array(TIME_TYPECODE, starts[time_size * offset:time_size * end]),
+                                       array(TIME_TYPECODE, ends[time_size * offset:time_size * end])))
+        offset = end
+    return traces
+
+def lift(part, cases, no_cases):
+    '''turns the events of a subset of the cases into events of all no_cases
+    cases, the subset is given by the sorted indices of its cases'''
+    lengths = np.zeros(no_cases, dtype=part[0].dtype)
+    lengths[cases] = part[0]
+    return (lengths,) + tuple(part[1:])
+
+def concatenate(parts, no_cases):
+    '''concatenates the events of each case over all parts, in order of the parts'''
+    non_empty_parts = [part for part in parts if len(part[1])]
+    if len(non_empty_parts) < 2:
+        return (non_empty_parts or parts)[0]
+    parts = non_empty_parts
+    lengths = sum(part[0] for part in parts)
+    #position of the next event of each case in the result
+    positions = np.cumsum(lengths) - lengths
+    result = [np.empty(lengths.sum(), dtype=values.dtype) for values in parts[0][1:]]
+    for part in parts:
+        part_lengths = part[0]
+        part_offsets = np.cumsum(part_lengths) - part_lengths
+        index = (np.repeat(positions - part_offsets, part_lengths)
+                 + np.arange(len(part[1])))
+        for values, result_values in zip(part[1:], result):
+            result_values[index] = values
+        positions += part_lengths
+    return (lengths,) + tuple(result)
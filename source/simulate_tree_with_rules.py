@@ -11,30 +11,46 @@ import sys
 #sys.path.insert(0, 'datasimpy/')
 sys.path.insert(0, '../simpy')
 import random
-from case_attribute import CaseAttribute
+from bisect import bisect_right
+from case_attribute import CaseAttributeTable
+from decision_index import DecisionIndex, matches
+from forced_noise import removed_rule_plans, forced_selection, assign_antecedent, acceptance_rate, \
+    MAX_FORCED_ATTEMPTS
 from core import Environment
-from events import AllOf, AnyOf, NOf, Zombie
+from events import Zombie, SplitGateway, JoinGateway
+from random_stream import default_stream
+from bpsim_sequence import BpsimSequence
+from encoded_trace import EncodedTrace
+
+#number of cases of which the case attributes are drawn at once
+BATCH_SIZE = 10000
 
 class Case():
     '''
     Attributes:
-        -trace: list of activity names in order of occurrence
-        -case_attrs: list of case attributes (objects)
+        -trace: list of activity names in order of occurrence, or the EncodedTrace of their ids
+         when the simulator is given a vocabulary
+        -attributes: table with the case attributes of the cases of a batch (CaseAttributeTable)
+        -index: index of the case in the table
+        -choice_attrs: list of (name, activity) of the choices executed in the case
     '''
 
-    def __init__(self, case_attrs):
+    def __init__(self, attributes, index):
         self.trace = []
-        self.case_attrs= case_attrs
+        self.attributes = attributes
+        self.index = index
+        self.choice_attrs = []
         self.no_rules_fired = 0
 
-    def initialize_case_attrs(self):
-        for attr in self.case_attrs:
-            # print attr.name, attr.type
-            if attr.type == 'bool':
-                attr.assign_value(bool(random.getrandbits(1)))
-            else:
-                attr.assign_value(random.random())
-                # print attr.value
+    def attribute_values(self):
+        '''returns the values of the case attributes as a dictionary {name: value}'''
+        return self.attributes.values(self.index)
+
+    def attribute_items(self):
+        '''returns the (name, type, value) of the case attributes followed by those of the
+        choice attributes (of type string)'''
+        return self.attributes.items(self.index) + \
+            [(name, 'string', value) for name, value in self.choice_attrs]
 
 class Log():
     '''
@@ -57,47 +73,104 @@ class LogSimulator():
         -record_timestamps: whether or not timestamps of the activities will be logged (start+complete)
         -log: contains a list of cases (each case has a trace and optionally some case attributes)
         -env: environment needed for the simpy simulation
+        -vocabulary: activity vocabulary (encoded_trace) that encodes the traces, or None
     '''
 
-    def __init__(self,newick_tree,choice_first_leaves,rules,case_attrs,record_timestamps):
-        '''initialize the simulator by building the bpsim model'''
+    def __init__(self,newick_tree,choice_first_leaves,rules,case_attrs,record_timestamps,rng=None,
+                 vocabulary=None):
+        '''initialize the simulator by building the bpsim model, the routing decisions and
+        durations are drawn from rng (default: the shared stream of random_stream)'''
         self.t = newick_tree
+        self.rng = rng if rng is not None else default_stream
+        self.vocabulary = vocabulary
         self.choice_first_leaves = choice_first_leaves
         #prepare rules here or beforehand?
         self.rules = rules
         self.case_attributes = case_attrs
         self.record_timestamps = record_timestamps
+        #index of each list of rules (of the rules and of the removed rules), by its id
+        self.decision_indices = dict()
+        # choices that route the current case to a given child, see iter_noisy_cases
+        self.forced = dict()
+        self.no_noise_attempts = 0
+        self.no_noisy_cases = 0
         self.log = Log()
         self.env = Environment()
         self._create_bpsim()
+        # the simpy network is built once and reused by every case
+        self._create_case_network()
 
     def simulate(self,no_cases):
         '''simulates the given bpsim model with rules and adds the generated cases to the log object'''
-        for i in range(no_cases):
-            eid = i+1
-            case = Case([CaseAttribute(attr.name,type=attr.type) for attr in self.case_attributes])
-            case.initialize_case_attrs()
-            # simulates one instance or case of the tree
-            self._create_case(eid,case)
-            self._run()
+        for case in self.iter_cases(no_cases):
             self.log.add_case(case)
         return self.log
 
     def simulate_noise(self,no_cases,no_noisy_cases,removed_rules):
         '''simulates the given bpsim model with REMOVED rules to add generated noisy cases to log object'''
-        for i in range(no_noisy_cases):
-            eid = no_cases + no_noisy_cases + i + 1
-            case = Case([CaseAttribute(attr.name,type=attr.type) for attr in self.case_attributes])
+        for case in self.iter_noisy_cases(no_cases,no_noisy_cases,removed_rules):
+            self.log.add_case(case)
+        return self.log
+
+    def iter_cases(self,no_cases):
+        '''simulates the given bpsim model with rules and yields the generated cases one at a time'''
+        for i, case in enumerate(self._iter_new_cases(no_cases)):
+            self.rng.start_case(i)
+            # simulates one instance or case of the tree
+            self._start_case(case)
+            self._run()
+            yield self._encode_trace(case)
+
+    def iter_noisy_cases(self,no_cases,no_noisy_cases,removed_rules):
+        '''simulates the given bpsim model with REMOVED rules and yields the generated noisy cases
+        one at a time. Each attempt picks a removed rule, assigns the case attributes of its
+        antecedent and forces the choices towards its branches and decision (see forced_noise),
+        after MAX_FORCED_ATTEMPTS failed attempts the case is simulated without forcing.'''
+        plans = removed_rule_plans(self.t, removed_rules)
+        for i, case in enumerate(self._iter_new_cases(no_noisy_cases)):
+            # the noisy cases are numbered after the fitting cases
+            self.rng.start_case(no_cases + i)
             # change the rules of the LogSimulator to the removed rules
             self.rules = removed_rules
+            attempts = 0
             # simulates one instance or case of the tree until data noise is achieved
             while (case.no_rules_fired == 0):
                 case.trace = []
-                case.initialize_case_attrs()
-                self._create_case(eid, case)
+                case.choice_attrs = []
+                if attempts > 0:
+                    case.attributes.draw(case.index)
+                if plans and attempts < MAX_FORCED_ATTEMPTS:
+                    antecedent, self.forced = self.rng.choice(plans)
+                    assign_antecedent(case.attributes, case.index, antecedent, self.rng.random)
+                else:
+                    self.forced = dict()
+                attempts += 1
+                self._start_case(case)
                 self._run()
-            self.log.add_case(case)
-        return self.log
+            self.forced = dict()
+            self.no_noise_attempts += attempts
+            self.no_noisy_cases += 1
+            yield self._encode_trace(case)
+
+    def _iter_new_cases(self,no_cases):
+        '''yields no_cases new cases, the case attributes of each batch of BATCH_SIZE cases
+        are drawn at once with the numpy generator of the stream'''
+        for first_case in range(0, no_cases, BATCH_SIZE):
+            table = CaseAttributeTable(self.case_attributes, min(BATCH_SIZE, no_cases - first_case),
+                                       self.rng.generator)
+            for index in range(len(table)):
+                yield Case(table, index)
+
+    def noise_acceptance_rate(self):
+        '''share of the simulated noisy attempts in which a removed rule fired'''
+        return acceptance_rate(self.no_noisy_cases, self.no_noise_attempts)
+
+    def _encode_trace(self,case):
+        '''replaces the list of activity ids of the case by its EncodedTrace when the simulator
+        has a vocabulary and returns the case'''
+        if self.vocabulary is not None:
+            case.trace = EncodedTrace.from_events(case.trace, False)
+        return case
 
     def _run(self):
         global env
@@ -107,78 +180,27 @@ class LogSimulator():
     def _create_bpsim(self):
         '''method derives the sequence of execution between process tree constructs'''
 
-        self.bpsim_sequence = []
-        self.join_endpoints = dict()
-
         #make a dictionary to save all needed activity generators
         self.act_generators = dict()
         leaves = self.t.get_leaves()
         for leaf in leaves:
             self.act_generators[leaf] = self._act_generator(leaf.name,leaf.id)
 
+        bpsim = BpsimSequence(self.t, "act")
+        self.bpsim_sequence = bpsim.sequence
+        self.join_endpoints = bpsim.join_endpoints
+
         #save the required number of arcs
-        #by default 1 for the start_node and 1 for each act
-        self.arcs = 1 + len(self.act_generators)
-
-        ####################################################################################
-        #traverse tree and deduce the sequence of the process tree operators and activities#
-        ####################################################################################
-        for node in self.t.traverse(strategy="preorder"):
-            if node.is_leaf():
-                start_node = self._determine_start_node(node)
-                end_node = self._determine_end_node(node)
-                self.bpsim_sequence.append((node, "act" , "", start_node, end_node))
-                for ancestor in node.get_ancestors():
-                    if node in ancestor.endpoints:
-                        ancestor.to_reach_endpoints -= 1
-                        #add join for XOR, AND, OR nodes
-                        if ancestor.to_reach_endpoints == 0 and ancestor.name not in ["sequence", "loop"]:
-                            self.arcs += 1
-                            self.bpsim_sequence.append((ancestor, "join", "", ancestor.endpoints))
-                        #add split for LOOP node
-                        elif ancestor.to_reach_endpoints == 0 and ancestor.name == "loop":
-                            end_nodes = []
-                            children = ancestor.get_children()
-                            end_nodes.append(self._determine_start_middle(children[1]))
-                            end_nodes.append(self._determine_start_middle(children[2]))
-                            start = self._loop_end_left(children[0])
-                            self.bpsim_sequence.append((ancestor,"split","",start, end_nodes))
-            else:
-                endpoints = []
-                real_endpoints = []
-                children = node.get_children()
-                for child in children:
-                    self._determine_endpoints(node, child, endpoints)
-                    if node.name != "sequence":
-                        self.arcs += 1
-                if not node.is_root():
-                    start_node = self._determine_start_node(node)
-                else:
-                    start_node = None
-                node.add_feature("endpoints", endpoints)
-                node.add_feature("to_reach_endpoints", len(endpoints))
-                if node.name not in ["sequence", "loop"]:
-                    for child in children:
-                        self._return_real_endpoints(child, real_endpoints)
-                    self.join_endpoints[node] = real_endpoints
-                    self.bpsim_sequence.append((node, "split", children, start_node))
-                elif node.name == "loop":
-                    endpoints_middle = []
-                    if children[1].is_leaf():
-                        endpoints_middle.append(children[1])
-                    else:
-                        if children[1].name in ["sequence", "loop"]:
-                            endpoints_middle.append(self._endpoint_loop_in_sequence(children[1]))
-                        else:
-                            endpoints_middle.append(children[1])
-                        self.join_endpoints[node] = endpoints_middle
-                    self.bpsim_sequence.append((node,"join", [start_node, endpoints_middle], children[0]))
+        #1 for the start_node, 1 for each act and the arcs of the splits and joins
+        self.arcs = 1 + len(self.act_generators) + bpsim.arcs
 
-    def _create_case(self,eid,case):
+    def _create_case_network(self):
         '''translate sequence of execution of process tree to sequence of events with generator functions'''
-        e = []
+        # the network is shared by all cases, so the processes get no case id
+        eid = 0
+        self.e = e = []
         joins = dict()
-        or_dict = dict()
+        or_joins = dict()
         loops_joins= dict()
         loops_splits = dict()
         for i in range(self.arcs):
@@ -186,14 +208,22 @@ class LogSimulator():
         out_arc = 1
         self.map_node_outgoing_arcs = dict()
         map_node_incoming_event = dict()
+        # the arcs of the nodes hold the branch inputs of the rules, see _holds
+        self.map_node_incoming_event = map_node_incoming_event
+
+        #loop whose middle child ends in a given join
+        loop_of_middle_end = dict()
+        for key, value in self.join_endpoints.items():
+            if key.name == "loop":
+                loop_of_middle_end[value[0]] = key
 
-        for element in self.bpsim_sequence:
+        for index, element in enumerate(self.bpsim_sequence):
             outgoing_arcs = []
             incoming_arcs = []
 
             #determining incoming events
             if element[0].name == "loop" and element[1] == "join":
-                if element != self.bpsim_sequence[0]:
+                if index != 0:
                     try:
                         if element[2][0][1] == "xor-split":
                             in_arc = out_arc
@@ -216,7 +246,7 @@ class LogSimulator():
                     incoming_arcs.append(out_arc)
                     loops_joins[element[0]] = out_arc
                 out_arc += 1
-            elif element != self.bpsim_sequence[0] and element[1] != "join":
+            elif index != 0 and element[1] != "join":
                 try:
                     if element[3][1] == "xor-join":
                         startevent = element[3][0]
@@ -230,7 +260,7 @@ class LogSimulator():
                 except:
                     startevent = element[3]
                     in_arc, self.map_node_outgoing_arcs = self._return_incoming_arc(startevent, self.map_node_outgoing_arcs)
-            elif element != self.bpsim_sequence[0] and element[1] == "join":
+            elif index != 0 and element[1] == "join":
                 startevents = self.join_endpoints[element[0]]
                 for startevent in startevents:
                     if startevent.is_leaf():
@@ -255,40 +285,33 @@ class LogSimulator():
                             pass
                         outgoing_arcs.append(loops_splits[in_event])
                     self.map_node_outgoing_arcs[element[0]] = outgoing_arcs
-                    split, routing = self._produce_split_generator(element[0], self.env, eid,
-                                                                  outgoing_arcs, e, or_dict,
-                                                                  case, map_node_incoming_event)
-                    self.env.process(split(e[in_arc], eid, routing))
+                    routing = self._produce_routing(element[0], self.env, outgoing_arcs, e,
+                                                    or_joins, map_node_incoming_event)
+                    SplitGateway(self.env, e[in_arc], routing)
                 else:
                     for i in range(len(element[2])):
                         outgoing_arcs.append(out_arc + i)
                     self.map_node_outgoing_arcs[element[0]] = outgoing_arcs
-                    split, routing = self._produce_split_generator(element[0], self.env, eid,
-                                                                  outgoing_arcs, e, or_dict,
-                                                                  case, map_node_incoming_event)
-                    self.env.process(split(e[in_arc], eid, routing))
+                    routing = self._produce_routing(element[0], self.env, outgoing_arcs, e,
+                                                    or_joins, map_node_incoming_event)
+                    SplitGateway(self.env, e[in_arc], routing)
                     out_arc = out_arc + i + 1
 
             elif element[1] == "join":
                 new_out_arc = out_arc
-                for key, value in self.join_endpoints.items():
-                    if key.name == "loop" and value[0] == element[0]:
-                        new_out_arc = loops_joins[key]
-                        out_arc = out_arc - 1
-                        break
+                if element[0] in loop_of_middle_end:
+                    new_out_arc = loops_joins[loop_of_middle_end[element[0]]]
+                    out_arc = out_arc - 1
                 joins[element[0]] = new_out_arc
                 self.map_node_outgoing_arcs[element[0]] = [new_out_arc]
-                join = self._produce_join_generator(element[0])
                 incoming_events = []
                 for i in incoming_arcs:
                     incoming_events.append(e[i])
                 #for joins we add multiple events to mapping to join node
                 #map_node_incoming_event[element[0]] = e[in_arc]
 
-                if element[0].name == "or":
-                    self.env.process(join(incoming_events, e[new_out_arc], or_dict, element[0], eid))
-                else:
-                    self.env.process(join(incoming_events, e[new_out_arc], eid))
+                join = self._produce_join(element[0], incoming_events, or_joins)
+                join.connect(incoming_events, e[new_out_arc])
                 out_arc = out_arc + 1
             else:
                 try:
@@ -297,7 +320,7 @@ class LogSimulator():
                         out2_arc = loops_joins[element[4][0]]
                         act_gen = self.act_generators[element[0]]
                         self.map_node_outgoing_arcs[element[0]] = [out2_arc]
-                        self.env.process(act_gen(self.env, e[in_arc], e[out2_arc], self._dur_a(), eid, case))
+                        self.env.process(act_gen(self.env, e[in_arc], e[out2_arc], self._dur_a(), eid))
                         if out_arc > in_arc:
                             out_arc -= 1
 
@@ -308,151 +331,35 @@ class LogSimulator():
                             out_arc += 1
                         act_gen = self.act_generators[element[0]]
                         self.map_node_outgoing_arcs[element[0]] = [out_arc]
-                        self.env.process(act_gen(self.env, e[in_arc], e[out_arc], self._dur_a(), eid, case))
+                        self.env.process(act_gen(self.env, e[in_arc], e[out_arc], self._dur_a(), eid))
                 except:
                     #incoming event is loop xor-split
                     if in_arc == out_arc:
                         out_arc += 1
                     act_gen = self.act_generators[element[0]]
                     self.map_node_outgoing_arcs[element[0]] = [out_arc]
-                    self.env.process(act_gen(self.env, e[in_arc], e[out_arc], self._dur_a(), eid, case))
+                    self.env.process(act_gen(self.env, e[in_arc], e[out_arc], self._dur_a(), eid))
                 out_arc = out_arc + 1
 
-        e[0].succeed()
-
-    def _determine_start_node(self,node):
-        '''
-        determine node that is executed before node
-
-        @type node: TreeNode
-        @param node: node of a newick tree
-
-        @rtype: TreeNode
-        @return: node that precedeces given node in execution sequence
-        '''
-        ancestors = node.get_ancestors()
-        if ancestors[0].name in ["choice", "parallel", "or"]:
-            return ancestors[0]
-        elif ancestors[0].name == "sequence":
-            children = ancestors[0].get_children()
-            index = children.index(node)
-            if index == 0:
-                if ancestors[0].is_root():
-                    return None
-                else:
-                    return self._determine_start_node(ancestors[0])
-            else:
-                if children[index-1].name == "loop":
-                    return self._endpoint_loop_in_sequence(children[index-1])
-                elif children[index-1].name == "sequence":
-                    return self._endpoint_loop_in_sequence(children[index-1])
-                else:
-                    return children[index-1]
-        else:
-            children = ancestors[0].get_children()
-            index = children.index(node)
-            if index == 0:
-                return [ancestors[0],"xor-join"]
-            else:
-                return [ancestors[0],"xor-split"]
-
-    def _determine_end_node(self,node):
-        '''
-        determine node that is executed after node
-
-        @type node: TreeNode
-        @param node: node of a newick tree
-
-        @rtype: TreeNode
-        @return: node that succeeds given node in execution sequence
-        '''
-        ancestors = node.get_ancestors()
-        if ancestors[0].name in ["choice", "parallel", "or"]:
-            return ancestors[0]
-        elif ancestors[0].name == "sequence":
-            children = ancestors[0].get_children()
-            index = children.index(node)
-            if index == (len(children) - 1):
-                if ancestors[0].is_root():
-                    return None
-                else:
-                    return self._determine_end_node(ancestors[0])
-            else:
-                return children[index+1]
-        else:
-            children = ancestors[0].get_children()
-            index = children.index(node)
-            if index == 0:
-                return [ancestors[0],"xor-split"]
-            elif index == 1:
-                return [ancestors[0],"xor-join"]
-            else:
-                if ancestors[0].is_root():
-                    return None
-                else:
-                    return self._determine_end_node(ancestors[0])
-
-    def _determine_start_middle(self, node):
-        '''start node middle child in loop'''
-        if node.name == "loop":
-            return [node,"xor-join"]
-        elif node.name == "sequence":
-            children = node.get_children()
-            return self._determine_start_middle(children[0])
-        else:
-            return node
-
-    def _loop_end_left(self, node):
-        '''method to determine end node of left child in loop'''
-        if node.name in ["sequence", "loop"]:
-            last_child = node.get_children()[-1]
-            return self._loop_end_left(last_child)
-        else:
-            return node
-
-    def _determine_endpoints(self, node, child, endpoints):
-        '''recursive function to determine endpoints'''
-        if node.name in ["choice", "parallel", "or"]:
-            if child.is_leaf():
-                endpoints.append(child)
-
-            else:
-                for grandchild in child.get_children():
-                    self._determine_endpoints(child, grandchild, endpoints)
-
-        elif node.name in ["sequence", "loop"]:
-            last_child = node.get_children()[-1]
-            if child == last_child:
-                if last_child.is_leaf():
-                    endpoints.append(last_child)
-
-                else:
-                    for grandchild in last_child.get_children():
-                        self._determine_endpoints(last_child, grandchild, endpoints)
-            else:
-                pass
-        return endpoints
-
-    def _return_real_endpoints(self, node, real_endpoints):
-        '''determine real endpoints node'''
-        if node.name in ["sequence", "loop"]:
-            last_child = node.get_children()[-1]
-            self._return_real_endpoints(last_child,real_endpoints)
-        else:
-            real_endpoints.append(node)
-        return real_endpoints
-
-    def _endpoint_loop_in_sequence(self, node):
-        '''special function to determine endpoint of loop for loops in first part of a sequence'''
-        last_child = node.get_children()[-1]
-        if last_child.name in ["sequence", "loop"]:
-            return self._endpoint_loop_in_sequence(last_child)
-        else:
-            return last_child
+    def _start_case(self,case):
+        '''reset the events left behind by the previous case and start the given case'''
+        self.case = case
+        # loops that repeated the case as it was forced to, see _xor_routing_generator2
+        self.repeated_loops = set()
+        # the case attributes of the condition, the choice attributes are added when their
+        # leaves are executed
+        self.case_values = case.attribute_values()
+        for event in self.e:
+            event.clear()
+        self.e[0].succeed()
 
     def _act_generator(self,act_name,act_id,res_name=""):
         '''creates generator function for activity'''
-        def act(env, start, end, fdur, eid, case, res=None):
+        # the trace gets the id of the activity when the traces are encoded
+        event = act_name
+        if self.vocabulary is not None and act_name != "tau":
+            event = self.vocabulary.encode(act_name)
+        def act(env, start, end, fdur, eid, res=None):
             while True:
                 yield start
 
@@ -461,14 +368,15 @@ class LogSimulator():
                     print("%d: request resource '%s' @%s" % (eid, res_name, env.now))
                     yield req
                 start_time = env.now
-                yield env.timeout(fdur())
+                yield env.recycled_timeout(fdur())
                 end_time = env.now
+                case = self.case
                 if act_name != "tau":
-                    case.trace.append(act_name)
-                if act_id in self.choice_first_leaves.keys():
-                    new_case_attr = CaseAttribute('choice_' + str(self.choice_first_leaves[act_id]))
-                    new_case_attr.assign_value(act_name)
-                    case.case_attrs.append(new_case_attr)
+                    case.trace.append(event)
+                if act_id in self.choice_first_leaves:
+                    choice_attr = 'choice_' + str(self.choice_first_leaves[act_id])
+                    case.choice_attrs.append((choice_attr, act_name))
+                    self.case_values[choice_attr] = act_name
                 if res is not None:
                     res.release(req)
 
@@ -479,9 +387,7 @@ class LogSimulator():
 
     def _dur_a(self):
         '''returns a function for picking a (random) duration of an activity'''
-        def fdur():
-            return random.randint(1,10000)
-        return fdur
+        return self.rng.integers(1,10000)
 
     def _return_incoming_arc(self,startevent,map_node_outgoing_arcs):
         '''determine the incoming arc (event) of a node'''
@@ -504,224 +410,151 @@ class LogSimulator():
         else:
             return False
 
-    def _produce_split_generator(self,node,env,eid,outgoing_indices,e,or_dict,case,map_node_incoming_event):
-        '''return the correct generator function for each type of split'''
+    def _produce_routing(self,node,env,outgoing_indices,e,or_joins,map_node_incoming_event):
+        '''return the routing function for each type of split'''
         outgoing_arcs = []
         for i in outgoing_indices:
                 outgoing_arcs.append(e[i])
         if node.name == "parallel":
-            and_split = self._and_split_generator('and')
             path_probabilities = []
             for child in node.get_children(): path_probabilities.append(child.dist)
-            and_routing = self._and_routing_generator(env, outgoing_arcs, path_probabilities)
-            return and_split, and_routing
+            return self._and_routing_generator(env, outgoing_arcs, path_probabilities)
 
         elif node.name in ["choice", "loop"]:
-            xor_split = self._xor_split_generator("xor")
             if node.name == "choice":
                 path_probabilities = dict()
                 for i,child in enumerate(node.get_children()):
                     path_probabilities[e[outgoing_indices[i]]] = child.dist
-                #xor_routing = self._xor_routing_generator(env,outgoing_arcs,path_probabilities,self.rules[node])
-                xor_routing = self._xor_routing_generator(env,outgoing_arcs,
-                                                         path_probabilities,
-                                                         self.rules.get(node,[]),
-                                                         case,map_node_incoming_event)
+                # the rules are looked up when routing, as simulate_noise swaps them
+                return self._xor_routing_generator(env,outgoing_arcs,
+                                                   path_probabilities,node,
+                                                   map_node_incoming_event)
             else:
-                xor_routing = self._xor_routing_generator2(env, outgoing_arcs)
-            return xor_split, xor_routing
+                return self._xor_routing_generator2(env, outgoing_arcs, node)
 
         else:
-            or_split = self._or_split_generator("or")
+            # the or-join is created with the split, which sets the number of branches to join
+            or_joins[node] = JoinGateway(env)
             path_probabilities = []
             for child in node.get_children(): path_probabilities.append(child.dist)
-            or_routing = self._or_routing_generator(env, outgoing_arcs, or_dict, node, path_probabilities)
-            return or_split, or_routing
+            return self._or_routing_generator(env, outgoing_arcs, or_joins[node], path_probabilities, node)
 
-    def _produce_join_generator(self, node):
-        '''return the correct generator function for each type of join'''
+    def _produce_join(self, node, incoming_events, or_joins):
+        '''return the join gateway for each type of join'''
         if node.name == "parallel":
-            and_join = self._and_join_generator("and")
-            return and_join
+            return JoinGateway(self.env, len(incoming_events))
 
         elif node.name in ["choice", "loop"]:
-            xor_join = self._xor_join_generator("xor")
-            return xor_join
+            return JoinGateway(self.env, 1)
 
         else:
-            or_join = self._or_join_generator("or")
-            return or_join
-
-    def _and_split_generator(self, and_name):
-        '''creates AND split generator function'''
-        def and_split(start, eid, routing_func):
-            while True:
-                yield start
-                yield self.env.timeout(0)
-                routing_func()
-                start.reset()
-        return and_split
+            return or_joins[node]
 
     def _and_routing_generator(self, env, events, path_probabilities):
-        '''creates AND routing function'''
+        '''creates AND routing function, that activates all branches in a random order'''
+        n = len(events)
+        sample = self.rng.sample
         def and_routing():
-            n = len(events)
-            chosen_events = []
-            random_event = random.choice(events)
-            for i in range (n):
-                while random_event in chosen_events:
-                    random_event = random.choice(events)
+            for random_event in sample(events, n):
                 random_event.succeed()
-                chosen_events.append(random_event)
         return and_routing
 
-
-    def _and_join_generator(self, and_name):
-        '''creates the AND join generator function'''
-        def and_join(start_events, end, eid):
-            while True:
-                join = AllOf(self.env, start_events)
-                yield join
-                yield self.env.timeout(0)
-                end.succeed()
-                for e in start_events: e.reset()
-        return and_join
-
-    def _xor_routing_generator2(self, env, events):
-        '''creates LOOP routing function'''
+    def _xor_routing_generator2(self, env, events, node=None):
+        '''creates LOOP routing function, the first event is the redo, a loop that is forced
+        to repeat for a noisy case takes it the first time'''
+        choice = self.rng.choice
         def xor_routing():
-            random_event = random.choice(events)
+            if node in self.forced and node not in self.repeated_loops:
+                self.repeated_loops.add(node)
+                random_event = events[0]
+            else:
+                random_event = choice(events)
             random_event.succeed()
         return xor_routing
 
-    def _or_split_generator(self, or_name):
-        '''creates OR split generator function'''
-        def or_split(start, eid, routing_func):
-            while True:
-                yield start
-                yield self.env.timeout(0)
-                routing_func()
-                start.reset()
-        return or_split
-
-    def _or_join_generator(self, or_name):
-        '''creates the OR join generator function'''
-        def or_join(start_events, end, or_dict, or_, eid):
-            while True:
-                join = NOf(self.env, start_events, or_dict, or_)
-                yield join
-                yield self.env.timeout(0)
-                end.succeed()
-                for e in start_events: e.reset()
-        return or_join
-
-    def _or_routing_generator(self, env, events, or_dict, or_, path_probabilities):
-        '''creates OR routing function'''
+    def _or_routing_generator(self, env, events, join, path_probabilities, node=None):
+        '''creates OR routing function, that activates a random subset of the branches, an or
+        that is forced for a noisy case activates at least the forced branches'''
+        n = len(events)
+        uniform = self.rng.uniform
+        sample = self.rng.sample
         def or_routing():
-            x = int(round(random.uniform(1,len(events))))
-            n=0
-            chosen_events = []
-            random_event = random.choice(events)
-            for i in range (x):
-                while random_event in chosen_events:
-                    random_event = random.choice(events)
+            x = int(round(uniform(1,n)))
+            if node in self.forced:
+                selected = forced_selection(events, self.forced[node], x, sample)
+            else:
+                selected = sample(events, x)
+            for random_event in selected:
                 random_event.succeed()
-                chosen_events.append(random_event)
-                n += 1
-            or_dict[or_] = n
+            join.required = len(selected)
         return or_routing
 
-    def _xor_split_generator(self, xor_name):
-        '''creates XOR split generator function'''
-        def xor_split(start, eid, routing_func):
-            while True:
-                yield start
-                yield self.env.timeout(0)
-                routing_func()
-                start.reset()
-        return xor_split
-
-    def _xor_join_generator(self, xor_name):
-        '''creates the XOR join generator function'''
-        def xor_join(start_events, end, eid):
-            while True:
-                join = AnyOf(self.env, start_events)
-                yield join
-                yield self.env.timeout(0)
-                end.succeed()
-                for e in start_events: e.reset()
-        return xor_join
-
-    def _xor_routing_generator(self,env,events,path_probabilities,rules,case,map_node_incoming_event):
+    def _xor_routing_generator(self,env,events,path_probabilities,node,map_node_incoming_event):
         '''creates XOR routing function using rules'''
+        # the routing tables are compiled once per gateway: cutoffs of the branches in the
+        # order of the events (the last branch takes the rest) and the cutoffs of each
+        # combination of candidates that has been encountered
+        cutoffs = self._cumulative_cutoffs([path_probabilities[event] for event in events])
+        candidate_tables = dict()
+        draw = self.rng.random
         def xor_routing():
-            candidates = self._determine_candidates(events,rules,case,map_node_incoming_event)
-            if len(candidates) > 0:
-                case.no_rules_fired += 1
-                if len(candidates) < 2:
-                    candidates[0].succeed()
-                else:
-                    self._return_random_candidate(path_probabilities,candidates).succeed()
+            case = self.case
+            if node in self.forced:
+                # a noisy case is routed towards the removed rule it violates
+                random_event = events[self.forced[node]]
             else:
-                x = random.random()
-                cutoffs = []
-                previous_cutoff = 0
-
-                for val in path_probabilities.values():
-                    cutoffs.append(previous_cutoff + val)
-                    previous_cutoff = previous_cutoff + val
-
-                j = len(cutoffs)
-                for i,value in enumerate(cutoffs):
-                    if x < value:
-                        j = i
-                        break
-                random_event = events[j]
-                random_event.succeed()
-
-                for event in events:
-                    if event != random_event:
-                        event.last_chosen = False
+                rules = self.rules.get(node,[])
+                candidates = self._determine_candidates(events,rules,case,map_node_incoming_event)
+                if len(candidates) > 0:
+                    case.no_rules_fired += 1
+                    if len(candidates) < 2:
+                        candidates[0].succeed()
                     else:
-                        event.last_chosen = True
+                        self._return_random_candidate(path_probabilities,candidates,candidate_tables).succeed()
+                    return
+                random_event = events[bisect_right(cutoffs, draw())]
+            random_event.succeed()
+
+            for event in events:
+                if event != random_event:
+                    event.last_chosen = False
+                else:
+                    event.last_chosen = True
         return xor_routing
 
-    def _return_random_candidate(self,path_probabilities,candidates):
-        '''return a random candidate taking the branch probabilities into account'''
-        x = random.random()
+    def _return_random_candidate(self,path_probabilities,candidates,candidate_tables):
+        '''return a random candidate taking the branch probabilities into account, the
+        normalised cutoffs of each combination of candidates are only computed once'''
+        key = tuple(candidates)
+        try:
+            cutoffs = candidate_tables[key]
+        except KeyError:
+            tot_probabilities = 0.0
+            for c in candidates:
+                tot_probabilities += path_probabilities[c]
+            cutoffs = self._cumulative_cutoffs([path_probabilities[c]/tot_probabilities for c in candidates])
+            candidate_tables[key] = cutoffs
+
+        return candidates[bisect_right(cutoffs, self.rng.random())]
+
+    def _cumulative_cutoffs(self,probabilities):
+        '''return the cumulative probabilities of all but the last path, ready for bisect'''
         cutoffs = []
         previous_cutoff = 0
-        tot_probabilities = 0.0
-        for c in candidates:
-            tot_probabilities += path_probabilities[c]
-
-        for c in candidates:
-            cutoffs.append(previous_cutoff + path_probabilities[c]/tot_probabilities)
-            previous_cutoff = previous_cutoff + path_probabilities[c]/tot_probabilities
-
-        j = len(cutoffs)
-        for i,value in enumerate(cutoffs):
-            if x < value:
-                j = i
-                break
-
-        return candidates[j]
-
-    def _make_condition(self,case,map_node_incoming_event):
-        '''combines all case attributes into condition dictionary:
-        {key_1:value_1,key_2:value_2,...}'''
-        c =  dict()
-        for attr in case.case_attrs:
-            c[attr.name] = attr.value
-        #print 'events once executed', [node for node,event in map_node_incoming_event.items() if event.once_executed==True]
-        for node,event in map_node_incoming_event.items():
-            if event.once_executed == True and event.last_chosen:
-                #map the node corresponding to the executed event to True
-                try:
-                    c[node] = True
-                except ValueError:
-                    print 'missing event', event
-        return c
+        for p in probabilities[:-1]:
+            previous_cutoff = previous_cutoff + p
+            cutoffs.append(previous_cutoff)
+        return cutoffs
+
+    def _holds(self,node):
+        '''returns True if the branch input of node holds: its incoming event was executed in
+        the case and was chosen the last time its choice was routed without a rule. The events
+        keep this state for the case, so it is read without building a condition.'''
+        try:
+            event = self.map_node_incoming_event[node]
+        except KeyError:
+            return False
+        return event.once_executed and event.last_chosen
 
     #@deprecated
     def _consequent_can_fire(self,events,rule):
@@ -733,27 +566,17 @@ class LogSimulator():
 
     def _condition_matches(self,condition,rule):
         '''returns true if the current condition matches the antecedent of the given rule'''
-        matches = True
-        condition_keys = set(condition.keys())
-        rule_keys = set(rule[0].keys())
-        absent_keys = rule_keys - condition_keys
-        intersect_keys = rule_keys.intersection(condition_keys)
-        if len(absent_keys) > 0:
-            matches = False
-        else:
-            for o in intersect_keys:
-                if type(condition[o]) == bool:
-                    if rule[0][o] != condition[o]:
-                        #print 'non-matching condition element:', rule[0][o], condition[o]
-                        matches = False
-                        break
-                else:
-                    if (condition[o] < rule[0][o][0] or condition[o] >= rule[0][o][1]):
-                        #print 'non-matching condition element:', rule[0][o], condition[o]
-                        matches = False
-                        break
-        #print rule, matches
-        return matches
+        return matches(rule[0], condition, condition.__contains__)
+
+    def _decision_index(self,rules):
+        '''returns the index of the given rules, it is built the first time they are used'''
+        try:
+            return self.decision_indices[id(rules)][1]
+        except KeyError:
+            index = DecisionIndex(rules)
+            #the rules are kept with their index, so that their id is not reused
+            self.decision_indices[id(rules)] = (rules, index)
+            return index
 
     def _return_incoming_event_child(self,node,map_node_incoming_event):
         '''normally should only occur in case of a sequence node is passed, then return incoming
@@ -761,14 +584,15 @@ class LogSimulator():
         return map_node_incoming_event[node.get_children()[0]]
 
     def _determine_candidates(self,events,rules,case,map_node_incoming_event):
-        '''determine all candidates that can be chosen'''
+        '''determine all candidates that can be chosen, the matching rules are looked up
+        in the index of the rules with the case attributes and the branch inputs of the case'''
         #print 'mapping', map_node_incoming_event
         candidates = []
-        condition = self._make_condition(case,map_node_incoming_event)
-        for rule in rules:
-            if self._condition_matches(condition,rule):
-                try:
-                    candidates.append(map_node_incoming_event[rule[1]])
-                except KeyError:
-                    candidates.append(self._return_incoming_event_child(rule[1],map_node_incoming_event))
+        if not rules:
+            return candidates
+        for consequent in self._decision_index(rules).candidates(self.case_values, self._holds):
+            try:
+                candidates.append(map_node_incoming_event[consequent])
+            except KeyError:
+                candidates.append(self._return_incoming_event_child(consequent,map_node_incoming_event))
         return candidates
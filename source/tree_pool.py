@@ -0,0 +1,62 @@
+# -*- coding: utf-8 -*-
+"""
+Processes a set of tree files, in a pool of worker processes when asked to
+
+Every tree file is processed on its own by a function that writes its
+results (e.g. the log of the tree) itself and returns nothing, so finished
+logs are never held by the pool. An exception raised for one tree is
+reported and does not abort the other trees.
+
+INPUT:
+    list of tree files
+    function(filepath, settings) that processes one tree file
+    settings passed to the function (must be picklable)
+    number of worker processes
+
+OUTPUT:
+    list of (tree file, error message) of the trees that failed
+"""
+
+import random
+import traceback
+import multiprocessing
+import numpy as np
+
+
+def process_tree_files(tree_files, process_tree, settings, workers=1):
+    tasks = [(process_tree, filepath, settings) for filepath in tree_files]
+    if workers > 1:
+        pool = multiprocessing.Pool(workers, initializer=reseed)
+        results = pool.imap_unordered(run_task, tasks, chunksize=1)
+    else:
+        pool = None
+        results = (run_task(task) for task in tasks)
+
+    failures = []
+    for filepath, error in results:
+        if error is not None:
+            print "ERROR: processing of tree %s failed" % filepath
+            print error
+            failures.append((filepath, error))
+
+    if pool is not None:
+        pool.close()
+        pool.join()
+    if failures:
+        print "%d of %d trees failed:" % (len(failures), len(tree_files)), \
+            ", ".join(filepath for filepath, error in failures)
+    return failures
+
+def run_task(task):
+    '''processes one tree file, returns the file and the error message if it failed'''
+    process_tree, filepath, settings = task
+    try:
+        process_tree(filepath, settings)
+    except Exception:
+        return filepath, traceback.format_exc()
+    return filepath, None
+
+def reseed():
+    '''forked workers inherit the random state of the parent, each one starts a new state'''
+    random.seed()
+    np.random.seed()
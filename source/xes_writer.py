@@ -1,16 +1,20 @@
 import xml.etree.ElementTree as xmltree
 import datetime
 
-def write_as_xes(cases,index,test=False):
+def write_as_xes(cases,index,test=False,vocabulary=None):
     '''
     Write log to xes-formatted file
 
-    @type cases: Case object
-    @param cases: case in a log (with trace and case attributes)
+    @type cases: iterable of Case objects
+    @param cases: cases in a log (with trace and case attributes), e.g. a generator
 
     @type tree_index: int
     @param tree_index: specifies the number of the tree used to name the log file
 
+    @type vocabulary: ActivityVocabulary
+    @param vocabulary: decodes the encoded traces of the cases when they are written, None
+    when the traces hold activity names
+
     '''
     if test:
         xes_file = open("../data/logs/log" + str(index) + "_test.xes", 'w')
@@ -42,11 +46,17 @@ def write_as_xes(cases,index,test=False):
     else:
         lname.attrib['value'] = "log" + str(index)
 
+    # the traces are written one at a time, the log is never held in memory
+    write_start_tag(xes_file, root)
     timestamp = 1
     for c_id,case in enumerate(cases):
         case_trace = case.trace
-        c_attributes = case.case_attrs
-        trace = xmltree.SubElement(root,'trace')
+        if vocabulary is not None:
+            case_trace = case_trace.decode(vocabulary)
+        # the attributes of the case are the same for each of its events
+        c_attributes = [('string' if attr_type != 'num' else 'float', name, str(value))
+                        for name, attr_type, value in case.attribute_items()]
+        trace = xmltree.Element('trace')
         tname = xmltree.SubElement(trace,'string')
         tname.attrib['key'] = "concept:name"
         tname.attrib['value'] = str(c_id)
@@ -63,16 +73,29 @@ def write_as_xes(cases,index,test=False):
             etime.attrib['key'] = "time:timestamp"
             etime.attrib['value'] = add_sec(datetime.datetime.today(),timestamp).isoformat()
             timestamp += 1
-            for attr in c_attributes:
-                if attr.type == 'bool':
-                    eattr = xmltree.SubElement(event, 'string')
-                else:
-                    eattr = xmltree.SubElement(event, 'float')
-                eattr.attrib['key'] = attr.name
-                eattr.attrib['value'] = str(attr.value)
-    xes_file.write(xmltree.tostring(root))
+            for tag, name, value in c_attributes:
+                eattr = xmltree.SubElement(event, tag)
+                eattr.attrib['key'] = name
+                eattr.attrib['value'] = value
+        xes_file.write(xmltree.tostring(trace))
+    write_end_tag(xes_file, root)
     xes_file.close()
 
+def write_start_tag(xes_file, root):
+    '''
+    Write an element with its children but without its end tag, the elements written
+    next become its following children
+
+    @type root: Element
+    @param root: element with at least one child (e.g. the log with its extensions)
+    '''
+    end_tag = "</%s>" % root.tag
+    xes_file.write(xmltree.tostring(root)[:-len(end_tag)])
+
+def write_end_tag(xes_file, root):
+    '''Write the end tag of an element started with write_start_tag'''
+    xes_file.write("</%s>" % root.tag)
+
 def add_sec(time, secs):
     time = time + datetime.timedelta(seconds=secs)
     return time
\ No newline at end of file
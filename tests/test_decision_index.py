@@ -0,0 +1,71 @@
+# -*- coding: utf-8 -*-
+"""
+Tests of the DecisionIndex of the rule-based simulators
+
+The consequents the index looks up for a case have to be those of a scan of
+all rules with matches, in the order of the rules.
+"""
+
+import os
+import sys
+import random
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'source'))
+from decision_index import DecisionIndex, matches
+import pytest
+
+
+class Branch():
+    '''stands in for the TreeNode of a branch input'''
+
+    def __init__(self, name):
+        self.name = name
+
+def random_rules(rng, bool_names, numeric_names, branches):
+    rules = []
+    for consequent in range(rng.randint(1, 30)):
+        antecedent = dict()
+        for name in rng.sample(bool_names, rng.randint(0, len(bool_names))):
+            antecedent[name] = rng.random() < 0.5
+        for name in rng.sample(numeric_names, rng.randint(0, len(numeric_names))):
+            low, high = sorted(rng.choice([0.0, 0.25, 0.5, 0.75, 1.0]) for i in range(2))
+            antecedent[name] = (low, high)
+        for branch in rng.sample(branches, rng.randint(0, len(branches))):
+            antecedent[branch] = True
+        rules.append((antecedent, consequent))
+    return rules
+
+def random_case(rng, bool_names, numeric_names, branches):
+    '''values of a case, a case does not always have every attribute and its numerical
+    values are often on the bounds of the intervals'''
+    values = dict()
+    for name in bool_names:
+        if rng.random() < 0.9:
+            values[name] = rng.random() < 0.5
+    for name in numeric_names:
+        if rng.random() < 0.9:
+            values[name] = rng.choice([0.0, 0.25, 0.5, 0.75, 1.0, rng.random()])
+    holding = set(branch for branch in branches if rng.random() < 0.5)
+    return values, holding.__contains__
+
+@pytest.mark.parametrize("seed", range(100))
+def test_candidates_match_scan(seed):
+    rng = random.Random(seed)
+    bool_names = ["b%d" % i for i in range(rng.randint(0, 3))]
+    numeric_names = ["x%d" % i for i in range(rng.randint(0, 3))]
+    branches = [Branch("n%d" % i) for i in range(rng.randint(0, 3))]
+    rules = random_rules(rng, bool_names, numeric_names, branches)
+    index = DecisionIndex(rules)
+    #the same keys come back, so the cached consequents are checked as well
+    for case in range(300):
+        values, holds = random_case(rng, bool_names, numeric_names, branches)
+        expected = tuple(consequent for antecedent, consequent in rules
+                         if matches(antecedent, values, holds))
+        assert index.candidates(values, holds) == expected
+
+def test_interval_is_half_open():
+    index = DecisionIndex([({"x": (0.25, 0.5)}, "a"), ({"x": (0.5, 0.75)}, "b")])
+    holds = lambda node: False
+    assert index.candidates({"x": 0.25}, holds) == ("a",)
+    assert index.candidates({"x": 0.5}, holds) == ("b",)
+    assert index.candidates({"x": 0.75}, holds) == ()
+    assert index.candidates({}, holds) == ()
@@ -0,0 +1,99 @@
+# -*- coding: utf-8 -*-
+"""
+Tests of the simulation engines against the simpy engine
+
+Every engine has to produce the same distribution of traces as the simpy
+LogSimulator. The logs are compared by the total variation distance of their
+trace frequencies.
+"""
+
+import os
+import sys
+import random
+from collections import Counter
+package = os.path.join(os.path.dirname(__file__), '..')
+sys.path.insert(0, os.path.join(package, 'newick'))
+sys.path.insert(0, os.path.join(package, 'simpy'))
+sys.path.insert(0, os.path.join(package, 'source'))
+from tree import TreeNode
+from simulateLog import LogSimulator
+from sampleLog import LogSampler
+from generateSampler import CompiledSampler
+from sampleVariants import VariantSampler
+from random_stream import BlockRandomStream
+from encoded_trace import ActivityVocabulary
+import pytest
+
+NO_CASES = 10000
+
+TREES = [
+    "(a,(b:0.2,c:0.5,d:0.3)choice,e)sequence;",
+    "((a,b,tau)loop,(c:0.6,(d,e)sequence:0.4)choice)sequence;",
+    "((a,b)sequence,(c,(d,tau)sequence)parallel)parallel;",
+    "(a,((b,c)sequence,(d,e)parallel)or,(tau,f)sequence)sequence;",
+]
+
+#trees without concurrency, the variant sampler refuses the others
+SEQUENTIAL_TREES = TREES[:2] + [
+    "((a:0.7,(b,c,tau)loop:0.3)choice,(tau:0.5,(d:0.4,e:0.6)choice:0.5)choice)sequence;",
+]
+
+def activities(log):
+    '''trace frequencies of a log, the timestamps are left out'''
+    return Counter(tuple(event[0] if type(event) is tuple else event for event in trace)
+                   for trace in log)
+
+def distance(log, other_log):
+    '''total variation distance of the trace frequencies of two logs'''
+    frequencies, other_frequencies = activities(log), activities(other_log)
+    return sum(abs(frequencies[trace] / float(len(log)) - other_frequencies[trace] / float(len(other_log)))
+               for trace in set(frequencies) | set(other_frequencies)) / 2
+
+#logs of the simpy engine by tree and timestamps, every engine is compared with them
+simpy_logs = dict()
+
+def simpy_log(newick_tree, record_timestamps):
+    try:
+        return simpy_logs[(newick_tree, record_timestamps)]
+    except KeyError:
+        log = LogSimulator(newick_tree, NO_CASES, record_timestamps,
+                           rng=BlockRandomStream(1)).returnLog()
+        simpy_logs[(newick_tree, record_timestamps)] = log
+        return log
+
+@pytest.mark.parametrize("newick_tree", TREES)
+@pytest.mark.parametrize("record_timestamps", [False, True])
+def test_compiled_engine_same_log_as_direct_engine(newick_tree, record_timestamps):
+    #the encoded traces keep the seconds since the start of the log
+    vocabulary = ActivityVocabulary.from_tree(TreeNode(newick_tree, format=1))
+    random.seed(2)
+    direct_log = LogSampler(newick_tree, 1000, record_timestamps, vocabulary=vocabulary).returnLog()
+    random.seed(2)
+    log = CompiledSampler(newick_tree, 1000, record_timestamps, vocabulary=vocabulary).returnLog()
+    assert [list(trace) for trace in log] == [list(trace) for trace in direct_log]
+
+@pytest.mark.parametrize("newick_tree", TREES)
+@pytest.mark.parametrize("record_timestamps", [False, True])
+def test_compiled_engine_same_traces_as_simpy(newick_tree, record_timestamps):
+    random.seed(2)
+    log = CompiledSampler(newick_tree, NO_CASES, record_timestamps).returnLog()
+    assert distance(log, simpy_log(newick_tree, record_timestamps)) < 0.05
+
+@pytest.mark.parametrize("newick_tree", TREES)
+@pytest.mark.parametrize("record_timestamps", [False, True])
+def test_vectorised_engine_same_traces_as_simpy(newick_tree, record_timestamps):
+    log = LogSimulator(newick_tree, NO_CASES, record_timestamps, mode="vectorised",
+                       rng=BlockRandomStream(2)).returnLog()
+    assert len(log) == NO_CASES
+    assert distance(log, simpy_log(newick_tree, record_timestamps)) < 0.05
+
+@pytest.mark.parametrize("newick_tree", SEQUENTIAL_TREES)
+def test_variants_engine_same_traces_as_simpy(newick_tree):
+    log = VariantSampler(newick_tree, NO_CASES, rng=BlockRandomStream(2)).returnLog()
+    assert len(log) == NO_CASES
+    assert distance(log, simpy_log(newick_tree, False)) < 0.05
+
+@pytest.mark.parametrize("newick_tree", [tree for tree in TREES if tree not in SEQUENTIAL_TREES])
+def test_variants_engine_refuses_concurrency(newick_tree):
+    with pytest.raises(ValueError):
+        VariantSampler(newick_tree, NO_CASES)
@@ -0,0 +1,99 @@
+# -*- coding: utf-8 -*-
+"""
+Tests of the zero-delay lanes of the simpy Environment
+
+Events scheduled without a delay skip the heap and wait in a FIFO lane per
+priority. The order in which the environment processes events is compared
+with an environment that keeps every event in the heap. An idle environment
+can be reset to another time.
+"""
+
+import os
+import sys
+import random
+from heapq import heappush
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+from simpy.core import Environment
+from simpy.events import URGENT, NORMAL
+import pytest
+
+
+class HeapEnvironment(Environment):
+    '''environment that schedules every event in the heap'''
+
+    def schedule(self, event, priority=NORMAL, delay=0):
+        heappush(self._queue, (self._now + delay, priority, next(self._eid), event))
+
+def worker(env, name, rng, log, depth=0):
+    '''process that mixes zero and positive delays, triggered events, urgent
+    events and child processes, logs every step it takes'''
+    for step in range(rng.randint(1, 6)):
+        kind = rng.random()
+        if kind < 0.3:
+            yield env.timeout(0)
+        elif kind < 0.5:
+            yield env.recycled_timeout(rng.randint(1, 3))
+        elif kind < 0.6:
+            yield env.timeout(rng.random() * 2)
+        elif kind < 0.75:
+            event = env.event()
+            event.succeed()
+            yield event
+        elif kind < 0.85:
+            event = env.event()
+            event.ok = True
+            event._value = None
+            env.schedule(event, URGENT, rng.choice([0, 0, 1]))
+            yield event
+        elif depth < 3:
+            yield env.process(worker(env, name + "." + str(step), rng, log, depth + 1))
+        log.append((env.now, name, step))
+
+def simulate(env, seed):
+    rng = random.Random(seed)
+    log = []
+    for i in range(rng.randint(1, 8)):
+        env.process(worker(env, str(i), rng, log))
+    env.run()
+    return log
+
+@pytest.mark.parametrize("seed", range(200))
+def test_same_order_as_heap(seed):
+    assert simulate(Environment(), seed) == simulate(HeapEnvironment(), seed)
+
+def test_zero_delay_events_follow_due_heap_event():
+    #an event that is due now was scheduled earlier, it goes first at the same priority
+    env = Environment()
+    order = []
+    def first(env):
+        yield env.timeout(1)
+        order.append("first")
+    def second(env):
+        yield env.timeout(1)
+        order.append("second")
+        yield env.timeout(0)
+        order.append("second, zero delay")
+    def third(env):
+        yield env.timeout(1)
+        order.append("third")
+    env.process(first(env))
+    env.process(second(env))
+    env.process(third(env))
+    env.run()
+    assert order == ["first", "second", "third", "second, zero delay"]
+
+def test_reset_moves_the_time_of_an_idle_environment():
+    env = Environment()
+    assert simulate(env, 3)
+    env.reset(100)
+    assert env.now == 100
+    assert [time for time, name, step in simulate(env, 3)] == \
+        [time + 100 for time, name, step in simulate(Environment(), 3)]
+
+@pytest.mark.parametrize("delay", [0, 1])
+def test_reset_refuses_scheduled_events(delay):
+    env = Environment()
+    env.timeout(delay)
+    with pytest.raises(RuntimeError):
+        env.reset(100)
+    assert env.now == 0
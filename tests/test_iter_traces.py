@@ -0,0 +1,84 @@
+# -*- coding: utf-8 -*-
+"""
+Tests of the streaming of traces by the simulators and samplers
+
+iter_traces yields the traces one case at a time without filling the log. It
+has to give the traces of the log, start at first_case and only simulate the
+cases that are asked for. The same holds for the noise of NoiseGenerator.
+"""
+
+import os
+import sys
+import random
+from itertools import islice
+package = os.path.join(os.path.dirname(__file__), '..')
+sys.path.insert(0, os.path.join(package, 'newick'))
+sys.path.insert(0, os.path.join(package, 'simpy'))
+sys.path.insert(0, os.path.join(package, 'source'))
+from tree import TreeNode
+from simulateLog import LogSimulator
+from simulateTrace import TraceSimulator
+from sampleLog import LogSampler
+from generateSampler import CompiledSampler
+from add_noise import NoiseGenerator
+from random_stream import BlockRandomStream, CaseRandomStream
+from encoded_trace import ActivityVocabulary
+import pytest
+
+TREE = "(a,((b,c)sequence,(d,e)parallel)or,(f:0.3,g:0.7)choice,(h,i,tau)loop)sequence;"
+NO_CASES = 50
+
+ENGINES = {
+    "simpy": LogSimulator,
+    "vectorised": lambda *args, **kwargs: LogSimulator(*args, mode="vectorised", **kwargs),
+    "direct": LogSampler,
+    "compiled": CompiledSampler,
+}
+
+def events(traces):
+    return [list(trace) for trace in traces]
+
+def simulator(engine, no_cases, record_timestamps, rng):
+    vocabulary = ActivityVocabulary.from_tree(TreeNode(TREE, format=1))
+    return ENGINES[engine](TREE, no_cases, record_timestamps, rng=rng, vocabulary=vocabulary)
+
+@pytest.mark.parametrize("engine", sorted(ENGINES))
+@pytest.mark.parametrize("record_timestamps", [False, True])
+def test_same_traces_as_the_log(engine, record_timestamps):
+    log = simulator(engine, NO_CASES, record_timestamps, BlockRandomStream(4)).returnLog()
+    traces = simulator(engine, 0, record_timestamps, BlockRandomStream(4)).iter_traces(NO_CASES)
+    assert events(traces) == events(log)
+
+@pytest.mark.parametrize("engine", sorted(ENGINES))
+def test_only_the_cases_asked_for_are_simulated(engine):
+    streaming_simulator = simulator(engine, 0, True, BlockRandomStream(4))
+    traces = list(islice(streaming_simulator.iter_traces(10**9), 3))
+    assert len(traces) == 3
+    assert streaming_simulator.returnLog() == []
+
+@pytest.mark.parametrize("engine", ["simpy", "direct", "compiled"])
+def test_first_case(engine):
+    #every case has its own stream, the cases of a range are those of the complete log
+    log = simulator(engine, NO_CASES, False, CaseRandomStream(7, "_1")).returnLog()
+    traces = simulator(engine, 0, False, CaseRandomStream(7, "_1")).iter_traces(10, first_case=12)
+    assert events(traces) == events(log[12:22])
+
+@pytest.mark.parametrize("record_timestamps", [False, True])
+def test_trace_simulator_same_traces_as_the_log(record_timestamps):
+    vocabulary = ActivityVocabulary.from_tree(TreeNode(TREE, format=1))
+    log = simulator("simpy", NO_CASES, record_timestamps, BlockRandomStream(4)).returnLog()
+    trace_simulator = TraceSimulator(TREE, record_timestamps, rng=BlockRandomStream(4),
+                                     vocabulary=vocabulary)
+    traces = [trace_simulator.returnTrace()]
+    traces += [trace_simulator.simulate_case() for i in range(NO_CASES - 1)]
+    assert events(traces) == events(log)
+
+def test_noise_streams_the_traces_of_add_noise():
+    random.seed(3)
+    traces = [[random.choice("abcde") for i in range(random.randint(1, 8))] for j in range(200)]
+    noisy_traces = NoiseGenerator([list(trace) for trace in traces], 0.5, seed=9).resulting_traces
+    noise = NoiseGenerator([], 0.5, seed=9)
+    streamed_traces = noise.iter_noise(0.5, (list(trace) for trace in traces))
+    assert list(islice(streamed_traces, 10)) == noisy_traces[:10]
+    assert list(streamed_traces) == noisy_traces[10:]
+    assert noisy_traces != traces
@@ -0,0 +1,56 @@
+# -*- coding: utf-8 -*-
+"""
+Tests of the random number streams
+
+Reseeding a block stream restarts the functions it has handed out, and the
+direct and compiled samplers draw their numbers from the stream they are given.
+"""
+
+import os
+import sys
+package = os.path.join(os.path.dirname(__file__), '..')
+sys.path.insert(0, os.path.join(package, 'newick'))
+sys.path.insert(0, os.path.join(package, 'simpy'))
+sys.path.insert(0, os.path.join(package, 'source'))
+from tree import TreeNode
+from sampleLog import LogSampler
+from generateSampler import CompiledSampler
+from random_stream import BlockRandomStream
+from encoded_trace import ActivityVocabulary
+import pytest
+
+TREE = "(a,((b,c)sequence,(d,e)parallel)or,(f:0.3,g:0.7)choice,(h,i,tau)loop)sequence;"
+
+def draws(random, integers):
+    return [random() for i in range(25)], [integers() for i in range(25)]
+
+@pytest.mark.parametrize("block_size", [1, 7, 100])
+def test_seed_restarts_the_functions_handed_out(block_size):
+    rng = BlockRandomStream(3, block_size)
+    random, integers = rng.random, rng.integers(1, 6)
+    first_draws = draws(random, integers)
+    rng.seed(3)
+    assert draws(random, integers) == first_draws
+    fresh_rng = BlockRandomStream(3, block_size)
+    assert draws(fresh_rng.random, fresh_rng.integers(1, 6)) == first_draws
+
+@pytest.mark.parametrize("engine", [LogSampler, CompiledSampler])
+@pytest.mark.parametrize("record_timestamps", [False, True])
+def test_samplers_draw_from_the_given_stream(engine, record_timestamps):
+    vocabulary = ActivityVocabulary.from_tree(TreeNode(TREE, format=1))
+    logs = []
+    for seed in [5, 5, 6]:
+        log = engine(TREE, 200, record_timestamps, rng=BlockRandomStream(seed),
+                     vocabulary=vocabulary).returnLog()
+        logs.append([list(trace) for trace in log])
+    assert logs[0] == logs[1]
+    assert logs[0] != logs[2]
+
+@pytest.mark.parametrize("record_timestamps", [False, True])
+def test_compiled_engine_same_log_as_direct_engine_with_block_stream(record_timestamps):
+    vocabulary = ActivityVocabulary.from_tree(TreeNode(TREE, format=1))
+    direct_log = LogSampler(TREE, 200, record_timestamps, rng=BlockRandomStream(5),
+                            vocabulary=vocabulary).returnLog()
+    log = CompiledSampler(TREE, 200, record_timestamps, rng=BlockRandomStream(5),
+                          vocabulary=vocabulary).returnLog()
+    assert [list(trace) for trace in log] == [list(trace) for trace in direct_log]
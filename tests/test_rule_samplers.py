@@ -0,0 +1,96 @@
+# -*- coding: utf-8 -*-
+"""
+Tests of the rule-based simulator and the direct rule-aware sampler
+
+Both engines have to route every case by the rules that match its case
+attributes and branch inputs, and force every noisy case towards a removed rule.
+Given a vocabulary, they log the same traces encoded, and the xes writer
+decodes them again.
+"""
+
+import os
+import re
+import sys
+import random
+import numpy as np
+package = os.path.join(os.path.dirname(__file__), '..')
+sys.path.insert(0, os.path.join(package, 'newick'))
+sys.path.insert(0, os.path.join(package, 'simpy'))
+sys.path.insert(0, os.path.join(package, 'source'))
+from tree import TreeNode
+from case_attribute import CaseAttribute
+from simulate_tree_with_rules import LogSimulator
+from sample_tree_with_rules import LogSampler
+from encoded_trace import ActivityVocabulary
+from xes_writer import write_as_xes
+import pytest
+
+
+def rule_tree():
+    '''the first choice routes on x, the second one to d when b was executed, the
+    removed rule routes the second choice to e when c was executed'''
+    t = TreeNode("(a,(b:0.5,c:0.5)choice,(d:0.5,e:0.5)choice)sequence;", format=1)
+    for index, node in enumerate(t.traverse()):
+        node.id = str(index)
+    first_choice, second_choice = t.get_children()[1:]
+    node = dict((leaf.name, leaf) for leaf in t.get_leaves())
+    rules = {first_choice: [({"x": True}, node["b"]), ({"x": False}, node["c"])],
+             second_choice: [({node["b"]: True}, node["d"])]}
+    removed_rules = {second_choice: [({node["c"]: True}, node["e"])]}
+    return t, rules, removed_rules
+
+@pytest.fixture(params=[LogSimulator, LogSampler])
+def engine(request):
+    random.seed(3)
+    np.random.seed(3)
+    return request.param
+
+def test_cases_follow_the_rules(engine):
+    t, rules, removed_rules = rule_tree()
+    simulator = engine(t, dict(), rules, [CaseAttribute("x", 'bool')], False)
+    for case in simulator.iter_cases(500):
+        if case.attribute_values()["x"]:
+            assert case.trace == ["a", "b", "d"]
+        else:
+            assert case.trace[:2] == ["a", "c"]
+
+def test_noisy_cases_fire_a_removed_rule(engine):
+    t, rules, removed_rules = rule_tree()
+    simulator = engine(t, dict(), rules, [CaseAttribute("x", 'bool')], False)
+    for case in simulator.iter_noisy_cases(0, 200, removed_rules):
+        assert case.trace == ["a", "c", "e"]
+        assert case.no_rules_fired > 0
+    assert simulator.noise_acceptance_rate() == 1.0
+
+def cases(engine, t, rules, removed_rules, vocabulary):
+    random.seed(5)
+    np.random.seed(5)
+    simulator = engine(t, dict(), rules, [CaseAttribute("x", 'bool')], False,
+                       vocabulary=vocabulary)
+    return list(simulator.iter_cases(100)) + \
+        list(simulator.iter_noisy_cases(100, 50, removed_rules))
+
+def test_encoded_traces(engine):
+    t, rules, removed_rules = rule_tree()
+    vocabulary = ActivityVocabulary.from_tree(t)
+    encoded_cases = cases(engine, t, rules, removed_rules, vocabulary)
+    plain_cases = cases(engine, t, rules, removed_rules, None)
+    assert [case.trace.decode(vocabulary) for case in encoded_cases] == \
+        [case.trace for case in plain_cases]
+    assert [case.attribute_items() for case in encoded_cases] == \
+        [case.attribute_items() for case in plain_cases]
+
+def test_xes_writer_decodes_the_traces(engine, tmpdir, monkeypatch):
+    #the writer writes to ../data/logs and stamps the events with the current time
+    tmpdir.mkdir("data").mkdir("logs")
+    monkeypatch.chdir(tmpdir.mkdir("plugins"))
+    t, rules, removed_rules = rule_tree()
+    vocabulary = ActivityVocabulary.from_tree(t)
+    write_as_xes(cases(engine, t, rules, removed_rules, vocabulary), 1, vocabulary=vocabulary)
+    write_as_xes(cases(engine, t, rules, removed_rules, None), 2)
+    logs = []
+    for index in [1, 2]:
+        log = tmpdir.join("data", "logs", "log%d.xes" % index).read()
+        logs.append(re.sub(r'key="time:timestamp" value="[^"]*"', "", log.replace("log%d" % index, "")))
+    assert logs[0] == logs[1]
+    assert 'value="c"' in logs[0]
@@ -0,0 +1,81 @@
+# -*- coding: utf-8 -*-
+"""
+Tests of the sharded simulation of a seeded log in generate_logs
+
+A seeded log is simulated in shards of cases, every case with its own stream.
+The merged shards have to give the log of one simulation of all cases, with
+the clock running on from one shard to the next, for any number of workers.
+"""
+
+import os
+import sys
+import multiprocessing
+package = os.path.join(os.path.dirname(__file__), '..')
+sys.path.insert(0, os.path.join(package, 'newick'))
+sys.path.insert(0, os.path.join(package, 'simpy'))
+sys.path.insert(0, os.path.join(package, 'source'))
+sys.path.insert(0, os.path.join(package, 'plugins'))
+from tree import TreeNode
+from random_stream import CaseRandomStream
+from encoded_trace import ActivityVocabulary
+import generate_logs
+import pytest
+
+TREES = [
+    "(a,((b,c)sequence,(d,e)parallel)or,(f:0.3,g:0.7)choice,(h,i,tau)loop)sequence;",
+    #ends in a silent activity, most shards have no events at all
+    "((a:0.05,tau:0.95)choice,tau)sequence;",
+    #every case simulates only the child of the root that it selects
+    "((a,(b,c)parallel)sequence:0.5,(d,e,tau)loop:0.3,f:0.2)choice;",
+]
+SEED = 11
+NO_CASES = 60
+SHARD_SIZE = 8
+
+def events(traces):
+    return [list(trace) for trace in traces]
+
+def sharded_log(newick_tree, engine, workers, stream='module'):
+    shards = generate_logs.log_shards(newick_tree, "_1", NO_CASES, True, engine, SEED, stream,
+                                      shard_size=SHARD_SIZE)
+    if workers > 1:
+        generate_logs.shard_pool = multiprocessing.Pool(workers)
+        generate_logs.shard_pool_size = workers
+    try:
+        return events(generate_logs.iter_shards(shards))
+    finally:
+        if workers > 1:
+            generate_logs.shard_pool.close()
+            generate_logs.shard_pool.join()
+            generate_logs.shard_pool = None
+            generate_logs.shard_pool_size = 1
+
+@pytest.mark.parametrize("newick_tree", TREES)
+@pytest.mark.parametrize("engine", ["simpy", "direct", "compiled"])
+def test_shards_give_the_log_of_one_simulation(newick_tree, engine):
+    vocabulary = ActivityVocabulary.from_tree(TreeNode(newick_tree, format=1))
+    rng = CaseRandomStream(SEED, "_1")
+    log = events(generate_logs.iter_traces(newick_tree, NO_CASES, True, engine, rng,
+                                           vocabulary=vocabulary))
+    assert sharded_log(newick_tree, engine, 1) == log
+
+@pytest.mark.parametrize("newick_tree", TREES)
+@pytest.mark.parametrize("engine", ["simpy", "compiled", "vectorised"])
+@pytest.mark.parametrize("stream", ["module", "block"])
+def test_same_log_for_any_number_of_workers(newick_tree, engine, stream):
+    log = sharded_log(newick_tree, engine, 1, stream)
+    assert sharded_log(newick_tree, engine, 3, stream) == log
+
+@pytest.mark.parametrize("engine", ["simpy", "direct", "compiled"])
+def test_a_case_can_be_simulated_on_its_own(engine):
+    newick_tree = TREES[0]
+    vocabulary = ActivityVocabulary.from_tree(TreeNode(newick_tree, format=1))
+    log = sharded_log(newick_tree, engine, 1)
+    for case in [0, 17, NO_CASES - 1]:
+        rng = CaseRandomStream(SEED, "_1")
+        trace, = generate_logs.iter_traces(newick_tree, 1, True, engine, rng,
+                                           first_case=case, vocabulary=vocabulary)
+        #the case starts at 0 instead of at the end of the case before it
+        offset = log[case][0][1] - trace.starts[0] if len(trace) else 0
+        assert [(activity, start + offset, end + offset) for activity, start, end in trace] == \
+            log[case]
@@ -0,0 +1,125 @@
+# -*- coding: utf-8 -*-
+"""
+Tests of passing encoded traces through shared memory
+
+The traces read from the shared memory files have to be the traces that were
+written, and no file may be left in the shared memory folder once the traces
+are read, removed without being read, failed to be written or abandoned by
+the reader of a sharded log.
+"""
+
+import os
+import sys
+import glob
+import random
+import multiprocessing
+from array import array
+from itertools import islice
+package = os.path.join(os.path.dirname(__file__), '..')
+sys.path.insert(0, os.path.join(package, 'newick'))
+sys.path.insert(0, os.path.join(package, 'simpy'))
+sys.path.insert(0, os.path.join(package, 'source'))
+sys.path.insert(0, os.path.join(package, 'plugins'))
+from encoded_trace import EncodedTrace, TIME_TYPECODE
+from shared_traces import write_shared_traces, read_shared_traces, remove_shared_traces, \
+    SHARED_FOLDER, INITIAL_CAPACITY
+import generate_logs
+import pytest
+
+TREE = "(a,((b,c)sequence,(d,e)parallel)or,(f:0.3,g:0.7)choice,(h,i,tau)loop)sequence;"
+
+
+def random_traces(no_traces, timed, seed=1):
+    '''encoded traces of random lengths, empty ones included'''
+    rng = random.Random(seed)
+    traces = []
+    for i in range(no_traces):
+        length = rng.randint(0, 12)
+        activities = array('H', [rng.randint(0, 2**16 - 1) for j in range(length)])
+        if timed:
+            starts = array(TIME_TYPECODE, sorted(rng.randint(0, 10**9) for j in range(length)))
+            ends = array(TIME_TYPECODE, [start + rng.randint(1, 10000) for start in starts])
+            traces.append(EncodedTrace(activities, starts, ends))
+        else:
+            traces.append(EncodedTrace(activities))
+    return traces
+
+def events(traces):
+    return [list(trace) for trace in traces]
+
+def shared_files():
+    return set(glob.glob(os.path.join(SHARED_FOLDER, "traces_*")))
+
+@pytest.mark.parametrize("timed", [False, True])
+@pytest.mark.parametrize("no_traces", [0, 1, 10, 3 * INITIAL_CAPACITY])
+def test_read_the_traces_that_were_written(timed, no_traces):
+    traces = random_traces(no_traces, timed)
+    shared = write_shared_traces(iter(traces))
+    assert shared[1:] == (no_traces, sum(len(trace) for trace in traces),
+                          timed and any(len(trace) for trace in traces))
+    assert events(read_shared_traces(shared)) == events(traces)
+
+def test_read_with_offset():
+    traces = random_traces(100, True)
+    shared = write_shared_traces(iter(traces))
+    for trace in traces:
+        trace.shift(500)
+    assert events(read_shared_traces(shared, 500)) == events(traces)
+
+@pytest.mark.parametrize("timed", [False, True])
+def test_changed_trace_does_not_change_the_others(timed):
+    #the read traces are views on the same arrays, a trace is copied before it is changed
+    traces = random_traces(20, timed)
+    read_traces = list(read_shared_traces(write_shared_traces(iter(traces))))
+    expected = events(traces)
+    for index in [3, 7]:
+        #as the noise does
+        read_traces[index].insert(0, read_traces[index][-1])
+        read_traces[index][1] = read_traces[index][2]
+        expected[index].insert(0, expected[index][-1])
+        expected[index][1] = expected[index][2]
+    assert events(read_traces) == expected
+
+@pytest.mark.parametrize("timed", [False, True])
+def test_files_are_removed_once_read(timed):
+    files = shared_files()
+    shared = write_shared_traces(iter(random_traces(50, timed)))
+    assert shared_files() - files
+    read_traces = read_shared_traces(shared)
+    #the files are removed as soon as they are mapped, the traces stay readable
+    first_trace = next(read_traces)
+    assert shared_files() == files
+    assert len(events([first_trace] + list(read_traces))) == 50
+
+@pytest.mark.parametrize("timed", [False, True])
+def test_files_are_removed_without_reading(timed):
+    files = shared_files()
+    remove_shared_traces(write_shared_traces(iter(random_traces(50, timed))))
+    assert shared_files() == files
+
+def test_files_are_removed_when_writing_fails():
+    files = shared_files()
+    def failing_traces():
+        for trace in random_traces(50, True):
+            yield trace
+        raise ValueError("simulation failed")
+    with pytest.raises(ValueError):
+        write_shared_traces(failing_traces())
+    assert shared_files() == files
+
+def test_files_are_removed_when_the_log_is_abandoned():
+    files = shared_files()
+    shards = generate_logs.log_shards(TREE, "_1", 60, True, "compiled", 3, "module",
+                                      shard_size=8)
+    generate_logs.shard_pool = multiprocessing.Pool(3)
+    generate_logs.shard_pool_size = 3
+    try:
+        traces = generate_logs.iter_shards(shards)
+        assert len(list(islice(traces, 10))) == 10
+        traces.close()
+    finally:
+        generate_logs.shard_pool.close()
+        generate_logs.shard_pool.join()
+        generate_logs.shard_pool = None
+        generate_logs.shard_pool_size = 1
+    assert shared_files() == files
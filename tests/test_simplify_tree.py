@@ -0,0 +1,102 @@
+# -*- coding: utf-8 -*-
+"""
+Tests of the simplification pass of the process trees
+
+The simplified tree has to produce the same trace distribution as the tree it
+was made of. For trees of sequences, choices and loops the distribution is
+computed exactly, trees with parallel and or operators are simulated.
+"""
+
+import os
+import sys
+import random
+from collections import Counter
+package = os.path.join(os.path.dirname(__file__), '..')
+sys.path.insert(0, os.path.join(package, 'newick'))
+sys.path.insert(0, os.path.join(package, 'simpy'))
+sys.path.insert(0, os.path.join(package, 'source'))
+from tree import TreeNode
+from simplify_tree import simplify_tree, routing_probabilities
+from sampleVariants import sequence, choice
+from simulateLog import LogSimulator
+from random_stream import BlockRandomStream
+import pytest
+
+
+def random_tree(rng, operators, depth=0):
+    '''newick string of a random tree, the children of a choice get random probabilities'''
+    if depth > 3 or (depth > 0 and rng.random() < 0.35):
+        return rng.choice(["a", "b", "c", "d", "tau"])
+    operator = rng.choice(operators)
+    no_children = 3 if operator == "loop" else rng.randint(1 if operator == "sequence" else 2, 4)
+    children = [random_tree(rng, operators, depth + 1) for i in range(no_children)]
+    if operator == "choice":
+        weights = [rng.random() for child in children]
+        children = ["%s:%.3f" % (child, weight / sum(weights))
+                    for child, weight in zip(children, weights)]
+    return "(" + ",".join(children) + ")" + operator
+
+def variants(node):
+    '''exact trace distribution of a tree that may contain macro-step leaves'''
+    if node.is_leaf():
+        activities = getattr(node, "activities", [node.name])
+        return {tuple(name for name in activities if name != "tau"): 1.0}
+    children = node.get_children()
+    if node.name == "sequence":
+        results = {(): 1.0}
+        for child in children:
+            results = sequence(results, variants(child))
+        return results
+    elif node.name == "choice":
+        results = dict()
+        for child, probability in zip(children, routing_probabilities(children)):
+            if probability > 0:
+                results = choice(results, variants(child), probability)
+        return results
+    #a loop is not unrolled, it stands for a single step that is labelled with the
+    #distributions of its children
+    return {(tuple(frozenset((variant, round(probability, 9))
+                             for variant, probability in variants(child).items())
+                   for child in children),): 1.0}
+
+def assert_same_distribution(expected, actual):
+    for variant in set(expected) | set(actual):
+        assert abs(expected.get(variant, 0.0) - actual.get(variant, 0.0)) < 1e-9, variant
+
+@pytest.mark.parametrize("seed", range(100))
+@pytest.mark.parametrize("record_timestamps", [False, True])
+def test_same_variants_as_the_original_tree(seed, record_timestamps):
+    newick_tree = random_tree(random.Random(seed), ["sequence", "choice", "loop"]) + ";"
+    expected = variants(TreeNode(newick_tree, format=1))
+    simplified = simplify_tree(TreeNode(newick_tree, format=1), record_timestamps)
+    assert_same_distribution(expected, variants(simplified))
+
+@pytest.mark.parametrize("seed", range(100))
+def test_no_nested_operators_left(seed):
+    newick_tree = random_tree(random.Random(seed), ["sequence", "choice", "parallel", "loop"]) + ";"
+    simplified = simplify_tree(TreeNode(newick_tree, format=1), False)
+    for node in simplified.traverse():
+        if node.is_leaf() or node.up is None:
+            continue
+        if node.name in ["sequence", "parallel", "choice"]:
+            assert node.up.name != node.name
+        if node.name == "sequence":
+            assert len(node.children) > 1
+
+@pytest.mark.parametrize("newick_tree", [
+    "((a,b)sequence,(c,(d,tau)sequence)parallel)parallel;",
+    "((c:0.3,(a:0.5,b:0.5)choice:0.7)choice,(d,tau,e)sequence)parallel;",
+    "(a,((b,c)sequence,(d,e)parallel)or,(tau,f)sequence)sequence;",
+])
+@pytest.mark.parametrize("record_timestamps", [False, True])
+def test_same_traces_as_the_original_tree_with_concurrency(newick_tree, record_timestamps):
+    #the simulated trace distributions of both trees are at most 5% apart
+    no_cases = 10000
+    logs = []
+    for simplify in [False, True]:
+        simulator = LogSimulator(newick_tree, no_cases, record_timestamps, simplify=simplify,
+                                 rng=BlockRandomStream(int(simplify)))
+        logs.append(Counter(tuple(event[0] if record_timestamps else event for event in trace)
+                            for trace in simulator.returnLog()))
+    distance = sum(abs(logs[0][trace] - logs[1][trace]) for trace in set(logs[0]) | set(logs[1]))
+    assert distance / (2.0 * no_cases) < 0.05
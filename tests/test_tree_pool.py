@@ -0,0 +1,58 @@
+# -*- coding: utf-8 -*-
+"""
+Tests of the processing of tree files in a pool of workers
+
+Every tree file has to be processed exactly once, a failing tree must not stop
+the others and every worker has to draw its own random numbers.
+"""
+
+import os
+import sys
+import time
+import random
+import numpy as np
+package = os.path.join(os.path.dirname(__file__), '..')
+sys.path.insert(0, os.path.join(package, 'source'))
+from tree_pool import process_tree_files
+import pytest
+
+
+def write_draws(filepath, folder):
+    '''writes the pid of the process and a draw of both random modules for a tree file,
+    fails for the files whose name starts with "bad"'''
+    if os.path.basename(filepath).startswith("bad"):
+        raise ValueError("bad tree")
+    #a tree takes a while, so that every worker gets some of them
+    time.sleep(0.05)
+    result = open(os.path.join(folder, os.path.basename(filepath) + ".out"), 'w')
+    result.write("%d %r %r" % (os.getpid(), random.random(), np.random.random_sample()))
+    result.close()
+
+def results(folder):
+    '''pid and draws by tree file that are written to the folder'''
+    folder = str(folder)
+    return dict((name[:-len(".out")], open(os.path.join(folder, name)).read().split())
+                for name in os.listdir(folder))
+
+@pytest.mark.parametrize("workers", [1, 3])
+def test_every_tree_is_processed_once(tmpdir, workers):
+    tree_files = ["tree_%d.nw" % i for i in range(12)]
+    assert process_tree_files(tree_files, write_draws, str(tmpdir), workers) == []
+    assert sorted(results(tmpdir)) == sorted(tree_files)
+
+@pytest.mark.parametrize("workers", [1, 3])
+def test_failing_tree_does_not_stop_the_others(tmpdir, workers):
+    tree_files = ["tree_1.nw", "bad_2.nw", "tree_3.nw", "bad_4.nw", "tree_5.nw"]
+    failures = process_tree_files(tree_files, write_draws, str(tmpdir), workers)
+    assert [filepath for filepath, error in failures] in (["bad_2.nw", "bad_4.nw"],
+                                                           ["bad_4.nw", "bad_2.nw"])
+    assert all("ValueError: bad tree" in error for filepath, error in failures)
+    assert sorted(results(tmpdir)) == ["tree_1.nw", "tree_3.nw", "tree_5.nw"]
+
+def test_workers_draw_their_own_random_numbers(tmpdir):
+    tree_files = ["tree_%d.nw" % i for i in range(12)]
+    process_tree_files(tree_files, write_draws, str(tmpdir), 3)
+    draws = results(tmpdir).values()
+    assert len(set(pid for pid, draw, numpy_draw in draws)) > 1
+    assert len(set(draw for pid, draw, numpy_draw in draws)) == len(tree_files)
+    assert len(set(numpy_draw for pid, draw, numpy_draw in draws)) == len(tree_files)